@@ -0,0 +1,35 @@
+import argparse
+import os
+from configuration import configuration
+from environments.goal_shards import build_goal_shards
+
+def house_scenes():
+    root = os.path.join(configuration.get('house3d').get('dataset_path'), 'render')
+    output_root = os.path.join(configuration.get('house3d').get('dataset_path'), 'render-shards')
+    return { x: os.path.join(root, x) for x in os.listdir(root) if os.path.isdir(os.path.join(root, x)) }, output_root
+
+def thor_scenes():
+    import download
+    root = download.downloader.resources_path
+    prefix = 'thor-scene-images-'
+    scenes = dict()
+    for x in os.listdir(root):
+        if x.startswith(prefix) and os.path.isdir(os.path.join(root, x, 'images')):
+            scenes[x[len(prefix):]] = os.path.join(root, x, 'images')
+    return scenes, os.path.join(root, 'thor-goal-shards')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Packs rendered goal images into memory mappable shards.')
+    parser.add_argument('dataset', type = str, choices = ['house', 'thor'], help = 'Goal images to pack')
+    parser.add_argument('--size', type = int, nargs = '+', default = [84], help = 'Image sizes (square) to pack, e.g. --size 84 172')
+    parser.add_argument('--modes', type = str, default = 'rgb,depth,semantic', help = 'Comma separated modalities')
+    parser.add_argument('--processes', type = int, default = None, help = 'Number of worker processes')
+    parser.add_argument('--rebuild', action = 'store_true', help = 'Rebuild existing shards')
+    args = parser.parse_args()
+
+    scenes, output_root = house_scenes() if args.dataset == 'house' else thor_scenes()
+    for size in args.size:
+        build_goal_shards(scenes, output_root, (size, size),
+            modes = args.modes.split(','),
+            processes = args.processes,
+            rebuild = args.rebuild)
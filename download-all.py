@@ -1,13 +1,135 @@
 from download import downloader
 from importlib import import_module
+from concurrent.futures import ProcessPoolExecutor
+import argparse
 import os
+import time
 
-if __name__ == '__main__':
-    for package in os.listdir('experiments'):
+def _find_strings(value):
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for x in value.values():
+            yield from _find_strings(x)
+    elif isinstance(value, (list, tuple)):
+        for x in value:
+            yield from _find_strings(x)
+
+def collect_experiments():
+    experiments = dict()
+    for package in sorted(os.listdir('experiments')):
         if not package.endswith('.py'):
             continue
         package = package[:-3]
-        import_module('experiments.' + package)
+        experiments[package] = import_module('experiments.' + package)
     import_module('environments')
+    return experiments
+
+def register_graphs():
+    from environments.gym_graph.download import register_house_graphs
+    import experiments.data as data
+    register_house_graphs(data.TRAIN[:4])
+
+def collect_tasks(experiments, all_graphs = False):
+    """Returns the resources and graphs the experiments need and whether they use House3D"""
+    from environments.gym_graph.download import graph_generators
+    register_graphs()
+    graphs = set(graph_generators.keys()) if all_graphs else set()
+    uses_houses = False
+    for name, module in experiments.items():
+        if not hasattr(module, 'default_args'):
+            continue
+        try:
+            args = module.default_args()
+        except Exception as e:
+            print('WARNING: Cannot read arguments of experiment %s (%s)' % (name, e))
+            continue
+        strings = list(_find_strings(args))
+        graphs.update(x for x in strings if x in graph_generators)
+        uses_houses = uses_houses or any('House' in x for x in strings)
+
+    return [('resource', x) for x in downloader.requirements] + [('graph', x) for x in sorted(graphs)], uses_houses
+
+def _mtime(path):
+    return os.stat(path).st_mtime_ns if os.path.exists(path) else None
+
+def run_task(kind, name):
+    """Builds a resource or a graph, returns True if it was not cached"""
+    from environments.util import file_lock
+    if kind == 'resource':
+        # The directory of a resource can exist before it is complete (e.g. interrupted scene
+        # images), the resource itself decides whether there is work left
+        path = os.path.join(downloader.resources_path, name)
+        with file_lock(path + '.lock'):
+            mtime = _mtime(path)
+            downloader.get(name)
+            return _mtime(path) != mtime
+    elif kind == 'graph':
+        from environments.gym_graph.download import build_graph
+        register_graphs()
+        return build_graph(name)
+    raise Exception('Unsupported task %s' % kind)
+
+def _timed_task(kind, name):
+    ts = time.time()
+    return run_task(kind, name), time.time() - ts
+
+def refresh_catalogs(uses_houses):
+    from environments.goal_catalog import GoalCatalog
+    root = downloader.resources_path
+    if os.path.isdir(root) and any(x.startswith('thor-scene-images-') for x in os.listdir(root)):
+        GoalCatalog(root, os.path.join(root, 'thor-scene-images.catalog.pkl'),
+            scene_prefix = 'thor-scene-images-', scene_subdir = 'images').refresh()
+
+    if uses_houses:
+        from configuration import configuration
+        dataset_path = configuration.get('house3d').get('dataset_path')
+        if os.path.isdir(os.path.join(dataset_path, 'render')):
+            GoalCatalog(os.path.join(dataset_path, 'render'), os.path.join(dataset_path, 'render-catalog.pkl')).refresh()
+
+def prepare_houses(processes):
+    from configuration import configuration
+    from environments.gym_house.env import create_configuration
+    from environments.gym_house.house_cache import prepare_connmaps
+    import experiments.data as data
+    houses = list(dict.fromkeys(house for name in dir(data) if name.isupper() for house in getattr(data, name)))
+    config = create_configuration(configuration.get('house3d'))
+    prepare_connmaps(houses, config, processes = processes)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Builds all resources, graph scenes and caches the experiments need.')
+    parser.add_argument('--workers', type = int, default = 4, help = 'Number of concurrent builds')
+    parser.add_argument('--all-graphs', action = 'store_true', help = 'Build every registered graph scene, not only those used by the experiments')
+    parser.add_argument('--skip-houses', action = 'store_true', help = 'Do not prepare House3D houses')
+    args = parser.parse_args()
+
+    experiments = collect_experiments()
+    tasks, uses_houses = collect_tasks(experiments, args.all_graphs)
+    report = []
+    ts = time.time()
+    print('Building %s resources and graphs ...' % len(tasks))
+    with ProcessPoolExecutor(max_workers = max(1, args.workers)) as executor:
+        futures = [(task, executor.submit(_timed_task, *task)) for task in tasks]
+        for (kind, name), future in futures:
+            try:
+                built, elapsed = future.result()
+                report.append((kind, name, 'built' if built else 'cached', elapsed))
+            except Exception as e:
+                print('ERROR: Cannot build %s %s (%s)' % (kind, name, e))
+                report.append((kind, name, 'FAILED', 0.0))
+
+    for kind, name, fn in [('catalogs', 'goal images', lambda: refresh_catalogs(uses_houses)), ('houses', 'house3d', lambda: prepare_houses(args.workers))]:
+        if kind == 'houses' and (args.skip_houses or not uses_houses):
+            continue
+        task_ts = time.time()
+        try:
+            fn()
+            report.append((kind, name, 'built', time.time() - task_ts))
+        except Exception as e:
+            print('ERROR: Cannot build %s (%s)' % (name, e))
+            report.append((kind, name, 'FAILED', time.time() - task_ts))
 
-    downloader.download_all()
\ No newline at end of file
+    print('Summary:')
+    for kind, name, status, elapsed in report:
+        print('  %-10s %-40s %-8s %.4f(s)' % (kind, name, status, elapsed))
+    print('  >> Done! Time Elapsed = %.4f(s)' % (time.time() - ts))
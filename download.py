@@ -1,9 +1,18 @@
 import requests
-import io
 import zipfile
+import hashlib
+import shutil
+import threading
+import fcntl
+import re
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from collections import namedtuple
 import os
 
+CHUNK_SIZE = 1024 * 1024
+MANIFEST_NAME = 'manifest.json'
+
 def _convert_name(name, acc = ''):
     if len(name) == 0:
         return acc
@@ -43,34 +52,158 @@ class Downloader:
     def require(self, name):
         self._all_requirements.append(name)
 
+    @property
+    def requirements(self):
+        """Names of the required resources in the order of registration, without duplicates"""
+        return list(dict.fromkeys(self._all_requirements))
+
     def get(self, name):
         return self.resources[name](self.create_context(name))
 
-    def download_all(self):
-        for r in self._all_requirements:
-            self.get(r)
+    def download_all(self, max_workers = 4):
+        """Fetches all required resources, at most max_workers at a time"""
+        names = self.requirements
+        errors = []
+        with ThreadPoolExecutor(max_workers = max(1, max_workers)) as executor:
+            futures = [(name, executor.submit(self.get, name)) for name in names]
+            for name, future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    print('ERROR: Resource %s failed (%s)' % (name, e))
+                    errors.append(e)
+        if len(errors) > 0:
+            raise errors[0]
 
 downloader = Downloader()
 
+_manifests = dict()
+_manifests_lock = threading.Lock()
+
+def fetch_manifest(base_url):
+    """Returns the checksums of the resources published at base_url
+
+    The manifest maps archive names to dict(sha256 = ...). If the server has
+    no manifest, an empty one is returned and downloads are not verified.
+    """
+    with _manifests_lock:
+        if base_url not in _manifests:
+            manifest = dict()
+            try:
+                response = requests.get(base_url + MANIFEST_NAME, timeout = 30)
+                if response.status_code == 200:
+                    manifest = response.json()
+                else:
+                    print('WARNING: No resource manifest at %s, downloads are not verified' % base_url)
+            except (requests.RequestException, ValueError) as e:
+                print('WARNING: Cannot fetch resource manifest (%s), downloads are not verified' % e)
+            _manifests[base_url] = manifest
+        return _manifests[base_url]
+
+@contextmanager
+def file_lock(path):
+    """Holds an exclusive lock on the file at path, shared by all processes on the host"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok = True)
+    with open(path, 'a') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+def sha256sum(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _content_range(response):
+    """Returns (start, total) of the Content-Range header, None for missing values"""
+    match = re.match(r'^bytes (?:(\d+)-\d+|\*)/(\d+|\*)$', response.headers.get('Content-Range', '').strip())
+    if match is None:
+        return None, None
+    start, total = match.groups()
+    return (int(start) if start is not None else None), (int(total) if total != '*' else None)
+
+def download_file(url, path):
+    """Streams url into path, a partial file left by an interrupted download is resumed
+
+    The partial file is only appended to if the server answers with the
+    requested range, otherwise the download starts from zero.
+    """
+    offset = os.path.getsize(path) if os.path.isfile(path) else 0
+    headers = { 'Range': 'bytes=%s-' % offset } if offset > 0 else dict()
+    with requests.get(url, headers = headers, stream = True, timeout = 60) as response:
+        if response.status_code == 416:
+            _, total = _content_range(response)
+            if offset > 0 and total in (None, offset):
+                # The partial file is already complete
+                return path
+            restart = True
+        else:
+            response.raise_for_status()
+            restart = offset > 0 and response.status_code == 206 and _content_range(response)[0] != offset
+
+        if not restart:
+            # A plain 200 is the whole file
+            mode = 'ab' if offset > 0 and response.status_code == 206 else 'wb'
+            with open(path, mode) as f:
+                for chunk in response.iter_content(chunk_size = CHUNK_SIZE):
+                    f.write(chunk)
+            return path
+
+    # The server misreported the range, the partial file cannot be trusted
+    print('WARNING: Cannot resume %s, downloading it again' % url)
+    os.remove(path)
+    return download_file(url, path)
+
 def download_resource(name, context):
     resource_path = os.path.join(context.resources_path, name)
     if os.path.exists(resource_path):
         return resource_path
 
+    os.makedirs(context.resources_path, exist_ok = True)
     url = context.base_url + '%s.zip' % name
-    try:
-        print('Downloading resource %s.' % name)  
-        response = requests.get(url)
-        with zipfile.ZipFile(io.BytesIO(response.content)) as z:
-            z.extractall(resource_path)
+    archive_path = resource_path + '.zip.part'
+    # Processes resuming the same download wait for each other instead of appending to the same file
+    with file_lock(archive_path + '.lock'):
+        if os.path.exists(resource_path):
+            return resource_path
+        return _download_and_extract(name, context, url, archive_path, resource_path)
 
-        print('Resource %s downloaded.' %name)
+def _download_and_extract(name, context, url, archive_path, resource_path):
+    tmp_path = '%s.%s.%s.tmp' % (resource_path, os.getpid(), threading.get_ident())
+    try:
+        print('Downloading resource %s.' % name)
+        download_file(url, archive_path)
+
+        checksum = fetch_manifest(context.base_url).get('%s.zip' % name, dict()).get('sha256')
+        if checksum is not None and sha256sum(archive_path) != checksum:
+            os.remove(archive_path)
+            raise IOError('Checksum mismatch of resource %s' % name)
+
+        # Extracted next to the resource and renamed, so a resource directory is always complete
+        with zipfile.ZipFile(archive_path) as z:
+            z.extractall(tmp_path)
+        try:
+            os.rename(tmp_path, resource_path)
+        except OSError:
+            # Another process extracted the resource first
+            if not os.path.isdir(resource_path):
+                raise
+        os.remove(archive_path)
+        print('Resource %s downloaded.' % name)
         return resource_path
 
-    except Exception as e:
-        if os.path.exists(resource_path):
-            os.remove(resource_path)
-        raise e
+    except zipfile.BadZipFile:
+        # A corrupted archive cannot be resumed
+        os.remove(archive_path)
+        raise
+
+    finally:
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path, ignore_errors = True)
 
 def register_resource(task):
     if isinstance(task, str):
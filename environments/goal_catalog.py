@@ -0,0 +1,180 @@
+import os
+import pickle
+from .goal_shards import split_image_name, sample_key
+from .util import file_lock
+
+GOAL_CATALOG_VERSION = 1
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class GoalCatalog:
+    """Persistent index of rendered goal images
+
+    Maps scene -> goal -> samples -> available modalities for a tree
+    <root>/<scene_prefix><scene>[/<scene_subdir>]/<goal>/<sample>-render_<mode>.png.
+    The catalog is stored in a single pickle file. A scene is revalidated by
+    the mtimes of its directories on the first access in a process, so only
+    the changed goal directories are listed again. Updates are made under a
+    file lock, so concurrent processes do not list the same scene twice.
+    """
+    def __init__(self, root, path, scene_prefix = '', scene_subdir = None):
+        self.root = root
+        self.path = path
+        self.scene_prefix = scene_prefix
+        self.scene_subdir = scene_subdir
+        self._data = dict(version = GOAL_CATALOG_VERSION, root_mtime = None, scene_names = [], scenes = dict())
+        self._validated = set()
+        self._dirty = set()
+        self._file_mtime = None
+        self._load()
+
+    def _load(self):
+        self._file_mtime = _mtime(self.path)
+        if self._file_mtime is None:
+            return
+        try:
+            with open(self.path, 'rb') as f:
+                data = pickle.load(f)
+        except Exception as e:
+            print('WARNING: Cannot load goal catalog %s (%s), rebuilding' % (self.path, e))
+            return
+        if data.get('version') == GOAL_CATALOG_VERSION:
+            self._data = data
+
+    def _reload(self):
+        """Loads the catalog again if another process stored it, returns whether it did"""
+        if _mtime(self.path) == self._file_mtime:
+            return False
+        self._load()
+        return True
+
+    def _lock(self):
+        return file_lock(self.path + '.lock')
+
+    def save(self):
+        """Stores the catalog, updates of other processes are merged in"""
+        if len(self._dirty) == 0:
+            return
+        with self._lock():
+            self._save()
+
+    def _save(self):
+        # Must be called with the lock held
+        scenes = { x: self._data['scenes'][x] for x in self._dirty if x in self._data['scenes'] }
+        listing = (self._data['root_mtime'], self._data['scene_names']) if '' in self._dirty else None
+        self._reload()
+        self._data['scenes'].update(scenes)
+        if listing is not None:
+            self._data['root_mtime'], self._data['scene_names'] = listing
+
+        tmp_path = '%s.%s.tmp' % (self.path, os.getpid())
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(self._data, f, protocol = pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+            self._file_mtime = _mtime(self.path)
+        except OSError as e:
+            print('WARNING: Cannot store goal catalog %s (%s)' % (self.path, e))
+        self._dirty = set()
+
+    def scene_path(self, scene):
+        path = os.path.join(self.root, self.scene_prefix + str(scene))
+        if self.scene_subdir is not None:
+            path = os.path.join(path, self.scene_subdir)
+        return path
+
+    def scene_names(self):
+        mtime = _mtime(self.root)
+        if mtime == self._data['root_mtime']:
+            return self._data['scene_names']
+
+        with self._lock():
+            # Another process may have listed the scenes while this one was waiting
+            self._reload()
+            if mtime != self._data['root_mtime']:
+                names = []
+                for name in os.listdir(self.root):
+                    if name.startswith(self.scene_prefix) and os.path.isdir(os.path.join(self.root, name)):
+                        names.append(name[len(self.scene_prefix):])
+                self._data['root_mtime'] = mtime
+                self._data['scene_names'] = sorted(names)
+                self._dirty.add('')
+                self._save()
+        return self._data['scene_names']
+
+    def _refresh_goal(self, path, entry):
+        mtime = _mtime(path)
+        if entry is not None and entry['mtime'] == mtime:
+            return entry, False
+
+        modes = dict()
+        for name in os.listdir(path):
+            sample, mode = split_image_name(name)
+            if sample is not None:
+                modes.setdefault(sample, set()).add(mode)
+
+        samples = sorted((x for x, m in modes.items() if 'rgb' in m), key = sample_key)
+        return dict(mtime = mtime, samples = samples, modes = { x: frozenset(m) for x, m in modes.items() }), True
+
+    def _scene(self, scene):
+        scene = str(scene)
+        if scene in self._validated:
+            return self._data['scenes'][scene]
+
+        entry, changed = self._validate_scene(scene)
+        if changed:
+            with self._lock():
+                # Another process may have listed the scene while this one was waiting
+                if self._reload():
+                    entry, changed = self._validate_scene(scene)
+                self._data['scenes'][scene] = entry
+                if changed:
+                    self._dirty.add(scene)
+                    self._save()
+
+        self._data['scenes'][scene] = entry
+        self._validated.add(scene)
+        return entry
+
+    def _validate_scene(self, scene):
+        """Returns the up to date entry of the scene and whether it differs from the stored one"""
+        path = self.scene_path(scene)
+        entry = self._data['scenes'].get(scene)
+        mtime = _mtime(path)
+        assert mtime is not None, 'Missing goal images of scene %s' % path
+        changed = entry is None or entry['mtime'] != mtime
+        if changed:
+            goal_names = [x for x in os.listdir(path) if os.path.isdir(os.path.join(path, x))]
+        else:
+            goal_names = list(entry['goals'].keys())
+
+        goals = dict()
+        for goal in goal_names:
+            goals[goal], goal_changed = self._refresh_goal(os.path.join(path, goal), None if entry is None else entry['goals'].get(goal))
+            changed = changed or goal_changed
+        return dict(mtime = mtime, goals = goals), changed
+
+    def goals(self, scene):
+        return list(self._scene(scene)['goals'].keys())
+
+    def samples(self, scene, goal):
+        """Returns the samples having an rgb image, the list must not be modified"""
+        return self._scene(scene)['goals'][goal]['samples']
+
+    def modes(self, scene, goal, sample):
+        return self._scene(scene)['goals'][goal]['modes'].get(sample, frozenset())
+
+    def sample(self, scene, goal, rng):
+        return rng.choice(self.samples(scene, goal))
+
+    def refresh(self):
+        """Revalidates all scenes"""
+        self._validated = set()
+        for scene in self.scene_names():
+            self._scene(scene)
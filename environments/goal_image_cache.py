@@ -0,0 +1,138 @@
+import os
+import random
+import hashlib
+import cv2
+from .goal_shards import split_image_name
+from .util import LRUCache
+
+
+def dataset_hash(path):
+    """Short hash identifying a dataset directory, used in the names of host-wide stores"""
+    return hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()[:12]
+
+
+class GoalImageCache:
+    """Goal images of a dataset read from goal shards or from the png files of a catalog
+
+    Decoded images are kept in an LRU cache and, when shared_cache is set,
+    in a `SharedArrayStore` shared by all workers on the host. Subclasses
+    create the shards, the catalog and the shared store of their dataset.
+    """
+    def __init__(self, image_size, shards, catalog, shared_store = None, cache_bytes = 256 * 1024 * 1024):
+        self.scenes = dict()
+        self.cache = LRUCache(max_bytes = cache_bytes)
+        self.image_size = image_size
+        self.random = random.Random()
+        self.shards = shards
+        self.catalog = catalog
+        self.shared_cache = shared_store
+
+    def seed(self, seed = None):
+        self.random.seed(seed)
+
+    def sample_image(self, collection):
+        return self.random.choice(collection)
+
+    def fetch_scene(self, scene):
+        if not scene in self.scenes:
+            self.scenes[scene] = sceneobj = dict(
+                path = self.catalog.scene_path(scene),
+                resources = dict()
+
+            )
+            
+            if self.shards.has_scene(scene):
+                sceneobj['available_goals'] = self.shards.goals(scene)
+            else:
+                sceneobj['available_goals'] = self.catalog.goals(scene)
+
+        return self.scenes[scene]
+
+    def all_goals(self, scene):
+        return self.fetch_scene(scene)['available_goals']
+
+    def read_image(self, impath):
+        try:
+            image = cv2.imread(impath)
+            image = cv2.resize(image, self.image_size, interpolation = cv2.INTER_CUBIC)
+        except Exception as e:
+            print('ERROR: wrong image %s' % impath)
+            raise e
+        return image
+
+    def fetch_image(self, root, scene, resource, sampled_image):
+        key = (scene, resource, sampled_image)
+        image = self.cache.get(key)
+        if image is not None:
+            return image
+
+        sample, mode = split_image_name(sampled_image)
+        if self.shards.has_image(scene, resource, sample, mode):
+            image = self.shards.fetch(scene, resource, sample, mode)
+        else:
+            if self.shared_cache is not None:
+                image = self.shared_cache.get(key)
+
+            if image is None:
+                impath = os.path.join(root, sampled_image)
+                assert os.path.isfile(impath), ('Missing file %s' % impath)
+                image = self.read_image(impath)
+                if self.shared_cache is not None:
+                    self.shared_cache.put(key, image)
+        self.cache.put(key, image)
+        return image
+
+    @property
+    def cache_stats(self):
+        stats = dict(nbytes = self.cache.nbytes, items = len(self.cache), **self.cache.stats)
+        if self.shared_cache is not None:
+            stats['shared_nbytes'] = self.shared_cache.nbytes
+        return stats
+
+    def fetch_resource(self, scene, resource):
+        self.fetch_scene(scene)
+        if not resource in self.scenes[scene]['resources']:
+            root = os.path.join(self.scenes[scene]['path'], resource)
+            if self.shards.has_scene(scene):
+                images = self.shards.samples(scene, resource)
+            else:
+                images = self.catalog.samples(scene, resource)
+            self.scenes[scene]['resources'][resource] = dict(
+                root = root,
+                images = images
+            )
+        else:
+            row = self.scenes[scene]['resources'][resource]
+            root, images = row['root'], row['images']
+
+        return root, images
+
+    def enumerate_all_paths(self):
+        for scene in self.catalog.scene_names():
+            for goal in self.catalog.goals(scene):
+                yield os.path.join(self.catalog.scene_path(scene), goal)
+
+    def all_image_paths(self, modes = ['rgb']):
+        suffixes = [('rgb', 'rgb'), ('depth', 'depth'), ('segmentation', 'semantic')]
+        for scene in self.catalog.scene_names():
+            for goal in self.catalog.goals(scene):
+                d = os.path.join(self.catalog.scene_path(scene), goal)
+                for sample in self.catalog.samples(scene, goal):
+                    yield tuple(os.path.join(d, '%s-render_%s.png' % (sample, mode)) for name, mode in suffixes if name in modes)
+
+    def all_images(self, modes = ['rgb']):
+        for impaths in self.all_image_paths(modes):
+            yield tuple(map(self.read_image, impaths))
+
+    def fetch_random(self, scene, resource):
+        root, images = self.fetch_resource(scene, resource)       
+        sampled_image = self.sample_image(images)        
+        return self.fetch_image(root, scene, resource, sampled_image + '-render_rgb.png'), os.path.join(root, sampled_image)
+
+    def fetch_random_with_semantic(self, scene, resource):
+        root, images = self.fetch_resource(scene, resource)       
+        sampled_image = self.sample_image(images)        
+        return (
+            self.fetch_image(root, scene, resource, sampled_image + '-render_rgb.png'),
+            self.fetch_image(root, scene, resource, sampled_image + '-render_semantic.png')
+        ), os.path.join(root, sampled_image)
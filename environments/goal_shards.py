@@ -0,0 +1,173 @@
+import os
+import re
+import json
+import time
+import multiprocessing
+import numpy as np
+import cv2
+
+GOAL_SHARDS_VERSION = 1
+MODES = ['rgb', 'depth', 'semantic']
+_sample_pattern = re.compile(r'^(.*)-render_([a-z]+)\.png$')
+
+
+def split_image_name(name):
+    """Splits e.g. 'loc_3-render_rgb.png' into ('loc_3', 'rgb')"""
+    match = _sample_pattern.match(name)
+    if match is None:
+        return None, None
+    return match.group(1), match.group(2)
+
+
+def sample_key(sample):
+    """Natural order of sample names, loc_2 goes before loc_10
+
+    Catalogs and shards list the samples in this order, so a seeded choice
+    picks the same goal image from both.
+    """
+    prefix, _, number = sample.rpartition('_')
+    return (prefix, int(number)) if number.isdigit() else (sample, -1)
+
+
+def scene_shard_path(root, image_size, scene):
+    return os.path.join(root, '%sx%s' % tuple(image_size), str(scene))
+
+
+class GoalShards:
+    """Reads goal images packed by `build_goal_shards`
+
+    Every scene has one raw uint8 array per modality with all goal images
+    resized to image_size, which are memory mapped on the first access, and
+    an index mapping goal -> sample -> row.
+    """
+    def __init__(self, root, image_size):
+        self.root = root
+        self.image_size = tuple(image_size)
+        self._indices = dict()
+        self._arrays = dict()
+
+    def _index(self, scene):
+        if scene not in self._indices:
+            path = os.path.join(scene_shard_path(self.root, self.image_size, scene), 'index.json')
+            index = None
+            if os.path.isfile(path):
+                with open(path, 'r') as f:
+                    index = json.load(f)
+                if index.get('version') != GOAL_SHARDS_VERSION:
+                    index = None
+            self._indices[scene] = index
+        return self._indices[scene]
+
+    def has_scene(self, scene):
+        return self._index(scene) is not None
+
+    def goals(self, scene):
+        return list(self._index(scene)['goals'].keys())
+
+    def samples(self, scene, goal):
+        return sorted(self._index(scene)['goals'].get(goal, dict()).keys(), key = sample_key)
+
+    def has_image(self, scene, goal, sample, mode):
+        index = self._index(scene)
+        return index is not None and mode in index['modes'] and sample in index['goals'].get(goal, dict())
+
+    def _array(self, scene, mode):
+        if (scene, mode) not in self._arrays:
+            index = self._index(scene)
+            path = os.path.join(scene_shard_path(self.root, self.image_size, scene), '%s.u8' % mode)
+            self._arrays[(scene, mode)] = np.memmap(path, dtype = np.uint8, mode = 'r', shape = tuple(index['shape']))
+        return self._arrays[(scene, mode)]
+
+    def fetch(self, scene, goal, sample, mode):
+        row = self._index(scene)['goals'][goal][sample]
+        return np.array(self._array(scene, mode)[row])
+
+
+def _read_resized(path, image_size):
+    image = cv2.imread(path)
+    if image is None:
+        raise IOError('Cannot read image %s' % path)
+    return cv2.resize(image, tuple(image_size), interpolation = cv2.INTER_CUBIC)
+
+
+def build_scene_shard(scene_path, output_path, image_size, modes = MODES):
+    """Packs <scene_path>/<goal>/<sample>-render_<mode>.png into a scene shard
+
+    Only samples having all the modes are packed. The shard is written next
+    to its final location and renamed, so readers never see partial shards.
+    """
+    samples = []
+    for goal in sorted(os.listdir(scene_path)):
+        goal_path = os.path.join(scene_path, goal)
+        if not os.path.isdir(goal_path):
+            continue
+        files = set(os.listdir(goal_path))
+        goal_samples = []
+        for name in files:
+            sample, mode = split_image_name(name)
+            if mode == modes[0] and all('%s-render_%s.png' % (sample, x) in files for x in modes):
+                goal_samples.append(sample)
+        samples.extend((goal, x) for x in sorted(goal_samples, key = sample_key))
+
+    width, height = image_size
+    shape = (len(samples), height, width, 3)
+    tmp_path = '%s.%s.tmp' % (output_path, os.getpid())
+    os.makedirs(tmp_path, exist_ok = True)
+    for mode in modes:
+        array = np.memmap(os.path.join(tmp_path, '%s.u8' % mode), dtype = np.uint8, mode = 'w+', shape = shape) if len(samples) > 0 else None
+        for i, (goal, sample) in enumerate(samples):
+            array[i] = _read_resized(os.path.join(scene_path, goal, '%s-render_%s.png' % (sample, mode)), image_size)
+        if array is not None:
+            array.flush()
+            del array
+        else:
+            open(os.path.join(tmp_path, '%s.u8' % mode), 'wb').close()
+
+    goals = dict()
+    for i, (goal, sample) in enumerate(samples):
+        goals.setdefault(goal, dict())[sample] = i
+    with open(os.path.join(tmp_path, 'index.json'), 'w') as f:
+        json.dump(dict(version = GOAL_SHARDS_VERSION, image_size = list(image_size), shape = list(shape), modes = list(modes), goals = goals), f)
+
+    if os.path.isdir(output_path):
+        old_path = '%s.%s.old' % (output_path, os.getpid())
+        os.rename(output_path, old_path)
+        os.rename(tmp_path, output_path)
+        for name in os.listdir(old_path):
+            os.remove(os.path.join(old_path, name))
+        os.rmdir(old_path)
+    else:
+        os.rename(tmp_path, output_path)
+    return len(samples)
+
+
+def _build_scene_shard(args):
+    return build_scene_shard(*args)
+
+
+def build_goal_shards(scenes, output_root, image_size, modes = MODES, processes = None, rebuild = False):
+    """Packs goal images of many scenes in a process pool
+
+    Args:
+        scenes: a dict mapping the scene name to its directory with goal images
+        output_root: root of the shards, the same one passed to `GoalShards`
+        image_size: (width, height) of the stored images
+    """
+    jobs = []
+    for scene, scene_path in sorted(scenes.items()):
+        output_path = scene_shard_path(output_root, image_size, scene)
+        if not rebuild and os.path.isfile(os.path.join(output_path, 'index.json')):
+            continue
+        os.makedirs(os.path.dirname(output_path), exist_ok = True)
+        jobs.append((scene_path, output_path, tuple(image_size), modes))
+
+    if len(jobs) == 0:
+        return
+
+    print('Packing goal images of %s scenes ...' % len(jobs))
+    ts = time.time()
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    with multiprocessing.Pool(max(1, min(processes, len(jobs)))) as pool:
+        total = sum(pool.imap_unordered(_build_scene_shard, jobs))
+    print('  >> Done! Packed %s samples, Time Elapsed = %.4f(s)' % (total, time.time() - ts))
@@ -7,6 +7,7 @@ import random
 
 from .env import EnvBase
 from .goal import GoalEnvBase
+from ...util import AuxiliaryTargetMixin, depth_to_uint8
 
 ACTIONS = [
     lambda add_noise: dict(action='MoveAhead', magnitude = add_noise(0.6), snapToGrid = False),
@@ -71,34 +72,36 @@ class GoalContinuousEnv(GoalEnvBase):
         else:
             return self.controller.step(action)
 
-class AuxiliaryEnv(GoalContinuousEnv):
-    def __init__(self, *args, **kwargs):
+class AuxiliaryEnv(AuxiliaryTargetMixin, GoalContinuousEnv):
+    def __init__(self, *args, auxiliary_target_size = None, auxiliary_cell_size = 4, **kwargs):
+        self._set_auxiliary_target(auxiliary_target_size, auxiliary_cell_size)
         super().__init__(*args, **kwargs)
+        target_size = self.auxiliary_target_shape
         self.observation_space = gym.spaces.Tuple((
             gym.spaces.Box(0, 255, self.screen_size + (3,), dtype=np.uint8),
             gym.spaces.Box(0, 255, self.screen_size + (3,), dtype=np.uint8),
-            gym.spaces.Box(0, 255, self.screen_size + (1,), dtype=np.uint8),
-            gym.spaces.Box(0, 255, self.screen_size + (3,), dtype=np.uint8),
-            gym.spaces.Box(0, 255, self.screen_size + (3,), dtype=np.uint8)))
+            gym.spaces.Box(0, 255, target_size + (1,), dtype=np.uint8),
+            gym.spaces.Box(0, 255, target_size + (3,), dtype=np.uint8),
+            gym.spaces.Box(0, 255, target_size + (3,), dtype=np.uint8)))
 
         self.initialize_kwargs['renderClassImage'] = True
         self.initialize_kwargs['renderDepthImage'] = True
 
     def _render_goal(self, scene, goal):
-        result, self.goal_image_path = self.goal_source.fetch_random_with_semantic(scene, goal)
-        return result
+        (goal_image, goal_segmentation), goal_image_path = self.goal_source.fetch_random_with_semantic(scene, goal)
+        return (goal_image, self._auxiliary_target(goal_segmentation)), goal_image_path
 
     def observe(self, event=None):
         if event is None:
             event = self._last_event
         self._last_event = event
         self.state = (event.metadata['agent']['position'], event.metadata['agent']['rotation'])
-        image = cv2.resize(event.frame, self.screen_size, interpolation=cv2.INTER_CUBIC)
-        segmentation = cv2.resize(event.class_segmentation_frame, self.screen_size, interpolation=cv2.INTER_NEAREST)
-        depth = (event.depth_frame * 255.0 / 5000.0).astype(np.uint8)
-        depth = cv2.resize(depth, self.screen_size, interpolation=cv2.INTER_CUBIC)
+        image = self._resize(event.frame)
+        segmentation = self._resize(event.class_segmentation_frame, interpolation=cv2.INTER_NEAREST)
+        depth = depth_to_uint8(event.depth_frame)
+        depth = self._resize(depth)
         depth = np.expand_dims(depth, 2)
         goal_img, goal_seg = self.goal_observation
-        return (image, np.copy(goal_img), depth, segmentation, np.copy(goal_seg))
+        return (image, np.copy(goal_img), self._auxiliary_target(depth), self._auxiliary_target(segmentation), np.copy(goal_seg))
 
     
\ No newline at end of file
@@ -6,6 +6,7 @@ import cv2
 import random
 
 from .env import EnvBase
+from ...util import LRUCache
 
 ACTIONS = [
     dict(action='MoveAhead'),
@@ -19,14 +20,95 @@ ACTIONS = [
 ]
 
 class DiscreteEnv(EnvBase):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, frame_cache_bytes = None, max_cached_transitions = 1000000, resync_period = 100, **kwargs):
+        """
+        Args:
+            frame_cache_bytes (int, optional): when set, observations are cached by the agent pose and
+                                               steps between cached poses do not call the simulator
+            resync_period (int, optional): maximum number of consecutive steps served from the cache
+        """
         super().__init__(*args, **kwargs)
         self.action_space = gym.spaces.Discrete(len(ACTIONS))
+
+        # Keyed by (scene, spawn seed, pose), the pose is quantized position, rotation and horizon.
+        # Only episodes with a remembered spawn seed (or without object spawns) are cached,
+        # fresh random seeds never repeat.
+        self.frame_cache = LRUCache(max_bytes = frame_cache_bytes) if frame_cache_bytes is not None else None
+        self.transitions = LRUCache(max_items = max_cached_transitions, sizeof = lambda _: 0)
+        self.resync_period = resync_period
+        self.frame_cache_stats = dict(hits = 0, misses = 0, resyncs = 0)
+        self._agent = None
+        self._synced = True
+        self._cached_steps = 0
+        self._cached_observation = None
+        self._episode_key = None
+
+    def reset(self):
+        self._cached_observation = None
+        observation = super().reset()
+        self._agent = self._event_agent(self._last_event)
+        self._synced = True
+        self._cached_steps = 0
+        self._episode_key = (self._last_scene, self._last_spawn_seed) if self._last_spawn_seed is None or self._last_spawn_seed_reused else None
+        return observation
+
+    def observe(self, event = None):
+        if event is None and self._cached_observation is not None:
+            # The last step was served from the frame cache, the last event shows an older pose
+            return np.copy(self._cached_observation)
+        self._cached_observation = None
+        return super().observe(event)
     
     def step(self, action):
+        if self.frame_cache is None or self._episode_key is None:
+            event = self.controller.step(ACTIONS[action])
+            return self._finish_step(event)
+
+        episode = self._episode_key
+        pose = self._pose_key(self._agent)
+        next_pose = self.transitions.get(episode + (pose, action))
+        if next_pose is not None and self._cached_steps < self.resync_period:
+            cached = self.frame_cache.get(episode + (next_pose,))
+            if cached is not None:
+                # The simulator is skipped, the agent pose is tracked here
+                observation, done, self._agent = cached
+                self.frame_cache_stats['hits'] += 1
+                self._cached_steps += 1
+                self._synced = False
+                self._cached_observation = observation
+                self.state = (self._agent[0], dict(x = 0.0, y = self._agent[1], z = 0.0))
+                return np.copy(observation), (0 if not done else 1.0), done, self._step_info()
+
+        self.frame_cache_stats['misses'] += 1
+        self._cached_steps = 0
+        if not self._synced:
+            self._teleport(self._agent)
+
         event = self.controller.step(ACTIONS[action])
-        return self._finish_step(event)
+        observation, reward, done, info = self._finish_step(event)
+        self._agent = self._event_agent(event)
+        self._synced = True
+
+        new_pose = self._pose_key(self._agent)
+        if next_pose is not None and next_pose != new_pose:
+            # The cached transition does not match the simulator
+            self.frame_cache_stats['resyncs'] += 1
+        self.transitions.put(episode + (pose, action), new_pose)
+        self.frame_cache.put(episode + (new_pose,), (np.copy(observation), done, self._agent))
+        return observation, reward, done, info
+
+    def _event_agent(self, event):
+        agent = event.metadata['agent']
+        return (dict(agent['position']), agent['rotation']['y'], agent['cameraHorizon'])
+
+    def _pose_key(self, agent):
+        position, rotation, horizon = agent
+        return (round(position['x'], 2), round(position['y'], 2), round(position['z'], 2), int(round(rotation)) % 360, int(round(horizon)))
+
+    def _teleport(self, agent):
+        position, rotation, horizon = agent
+        return self.controller.step(dict(action='Teleport', rotation=rotation, horizon=horizon, **position))
 
     def browse(self):
         from .browser import KeyboardAgent
-        return KeyboardAgent(self)
\ No newline at end of file
+        return KeyboardAgent(self)
@@ -4,11 +4,30 @@ import numpy as np
 import ai2thor.controller
 import cv2
 import random
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Number of spawn seeds remembered per scene and goal set
+MAX_SPAWN_SEEDS = 32
+
+# Probability of reusing a remembered spawn seed once all MAX_SPAWN_SEEDS are known
+SPAWN_SEED_REUSE = 0.9
 
 class EnvBase(gym.Env):
-    def __init__(self, scenes, screen_size = (224, 224), goals = ['Mug'], enable_noise=False, cameraY = 0.675):
+    def __init__(self, scenes, screen_size = (224, 224), goals = ['Mug'], enable_noise=False, cameraY = 0.675, native_resolution = True,
+            controller_pool_size = 1, scene_episodes = 1):
+        """
+        Args:
+            controller_pool_size (int, optional): number of controllers started on the first reset,
+                                                  each of them keeps one scene loaded
+            scene_episodes (int, optional): number of episodes played in a scene before sampling a new one
+        """
         self.screen_size = screen_size
+        self.native_resolution = native_resolution
         self.controller = ai2thor.controller.Controller(quality='Very Low')
+        self.controller_pool_size = max(1, controller_pool_size)
+        self.scene_episodes = max(1, scene_episodes)
         self.scenes = scenes
         self.goals = goals
         self.enable_noise = enable_noise
@@ -23,35 +42,113 @@ class EnvBase(gym.Env):
         self.initialize_kwargs = dict(cameraY = cameraY)
         self.state = None
         self._last_scene = None
+        self._reachable_positions = dict()
+        self._goal_objects = []
+
+        # Loaded scenes -> controllers, least recently used first
+        self._scene_controllers = OrderedDict()
+        self._idle_controllers = []
+        self._scene_episodes_left = 0
+        self._spawn_seeds = dict()
+        self._last_spawn_seed = None
+        self._last_spawn_seed_reused = False
+        self.reset_timings = None
+        self._report_reset_timings = False
 
     def reset(self):
+        timings = dict()
+        ts = time.time()
         if not self._was_started:
-            self.controller.start()
+            self._start_controllers()
             self._was_started = True
 
-        if isinstance(self.scenes, (list, tuple)):
-            selected_scene = self.random.choice(self.scenes)
-        else:
-            selected_scene = self.scenes
-
-        if self._last_scene != selected_scene:
-            print('Loading scene %s' % selected_scene)
-            self.controller.reset('FloorPlan%s' % selected_scene)
-            self._last_scene = selected_scene
+        selected_scene = self._select_scene()
+        self._activate_scene(selected_scene)
+        timings['scene'] = time.time() - ts
             
+        ts_phase = time.time()
         event = self.controller.step(dict(action='Initialize', **self.initialize_kwargs))
+        timings['initialize'] = time.time() - ts_phase
+
+        ts_phase = time.time()
         event = self._pick_goal(event, selected_scene)        
+        self._index_goal_objects(event)
+        timings['spawn'] = time.time() - ts_phase
 
+        ts_phase = time.time()
         num_trials = 0
         while self._has_finished(event):
             event = self._sample_start_position(event, selected_scene)
             num_trials += 1
             print('WARNING: Reset invoked to sample nonterminal state')
+        timings['start_position'] = time.time() - ts_phase
+        timings['total'] = time.time() - ts
 
+        self.reset_timings = timings
+        self._report_reset_timings = True
         return self.observe(event)
 
-    def _reset_objects(self):
-        seed = self.random.randint(1, 1000000)
+    def _select_scene(self):
+        if not isinstance(self.scenes, (list, tuple)):
+            return self.scenes
+
+        # Several episodes are played in a scene before switching
+        if self._last_scene is not None and self._scene_episodes_left > 0:
+            self._scene_episodes_left -= 1
+            return self._last_scene
+
+        self._scene_episodes_left = self.scene_episodes - 1
+        return self.random.choice(self.scenes)
+
+    def _activate_scene(self, scene):
+        if scene in self._scene_controllers:
+            self._scene_controllers.move_to_end(scene)
+            self.controller = self._scene_controllers[scene]
+        else:
+            if len(self._idle_controllers) > 0:
+                controller = self._idle_controllers.pop()
+            else:
+                # Reuses the controller of the least recently used scene
+                _, controller = self._scene_controllers.popitem(last = False)
+
+            print('Loading scene %s' % scene)
+            controller.reset('FloorPlan%s' % scene)
+            self._scene_controllers[scene] = controller
+            self.controller = controller
+        self._last_scene = scene
+
+    def _start_controllers(self):
+        controllers = [self.controller] + [ai2thor.controller.Controller(quality='Very Low') for _ in range(self.controller_pool_size - 1)]
+        if len(controllers) == 1:
+            self._start_controller(self.controller)
+        else:
+            with ThreadPoolExecutor(max_workers = len(controllers)) as executor:
+                list(executor.map(self._start_controller, controllers))
+        self._idle_controllers = controllers[::-1]
+
+    def _start_controller(self, controller):
+        if self.native_resolution:
+            # Frames rendered at the screen size do not need to be resized
+            width, height = self.screen_size
+            try:
+                controller.start(player_screen_width = width, player_screen_height = height)
+                return
+            except Exception as e:
+                print('WARNING: Cannot start the controller at %sx%s (%s), frames will be resized' % (width, height, e))
+
+        controller.start()
+
+    def _resize(self, frame, interpolation = cv2.INTER_CUBIC):
+        if frame.shape[1] == self.screen_size[0] and frame.shape[0] == self.screen_size[1]:
+            return frame
+        return cv2.resize(frame, self.screen_size, interpolation = interpolation)
+
+    def _reset_objects(self, seed = None):
+        # Only remembered seeds are passed explicitly
+        self._last_spawn_seed_reused = seed is not None
+        if seed is None:
+            seed = self.random.randint(1, 1000000)
+        self._last_spawn_seed = seed
         return self.controller.step(dict(action = 'InitialRandomSpawn', randomSeed = seed, forceVisible = True, maxNumRepeats = 5))
 
     def render(self, mode = 'human'):
@@ -62,15 +159,27 @@ class EnvBase(gym.Env):
             event = self._last_event
         self._last_event = event
         self.state = (event.metadata['agent']['position'], event.metadata['agent']['rotation'])
-        return cv2.resize(event.frame, self.screen_size, interpolation=cv2.INTER_CUBIC)
+        return self._resize(event.frame)
+
+    def _get_reachable_positions(self, scene):
+        # Reachable positions only depend on the scene and the grid size
+        key = (scene, self.initialize_kwargs.get('gridSize', 0.25))
+        if key not in self._reachable_positions:
+            event = self.controller.step(dict(action='GetReachablePositions'))
+            if event.metadata['actionReturn'] is None:
+                return None
+            self._reachable_positions[key] = event.metadata['actionReturn']
+        return self._reachable_positions[key]
 
     def _sample_start_position(self, event, selected_scene):
-        event = self.controller.step(dict(action='GetReachablePositions'))
-        if event.metadata['actionReturn'] is None:
+        positions = self._get_reachable_positions(selected_scene)
+        if positions is None:
             event = self.controller.step(dict(action='Initialize', **self.initialize_kwargs))
             event = self._pick_goal(event, selected_scene)
+            self._index_goal_objects(event)
+            positions = self._get_reachable_positions(selected_scene)
              
-        position = self.random.choice(event.metadata['actionReturn'])
+        position = self.random.choice(positions)
         rotation = self.random.random() * 360.0
         event = self.controller.step(dict(action='Teleport', horizon=0.0, rotation=rotation, **position))
         return event
@@ -79,10 +188,21 @@ class EnvBase(gym.Env):
         s = obj['objectId']
         return s[:s.index('|')].lower()
 
+    def _goal_types(self):
+        return self.goals
+
+    def _index_goal_objects(self, event):
+        goal_types = set(self._goal_types())
+        self._goal_objects = [(i, o['objectId']) for i, o in enumerate(event.metadata['objects']) if self._get_object_type(o) in goal_types]
+
     def _has_finished(self, event):
-        for o in event.metadata['objects']:
-            tp = self._get_object_type(o)
-            if tp in self.goals and o['distance'] < self.treshold_distance:
+        objects = event.metadata['objects']
+        if any(i >= len(objects) or objects[i]['objectId'] != object_id for i, object_id in self._goal_objects):
+            # The objects were reordered since the last reset
+            self._index_goal_objects(event)
+
+        for i, _ in self._goal_objects:
+            if objects[i]['distance'] < self.treshold_distance:
                 return True
         return False
 
@@ -91,10 +211,20 @@ class EnvBase(gym.Env):
         if len(self.goals) == 0:
             return event
 
+        # Spawn seeds known to produce goal objects in the scene
+        good_seeds = self._spawn_seeds.setdefault((scene, tuple(sorted(self.goals))), [])
+
+        # Known seeds are reused more often as they accumulate, the rest explores new spawns
+        reuse = self.random.random() < SPAWN_SEED_REUSE * len(good_seeds) / MAX_SPAWN_SEEDS
+
         hasgoal = False
         numtrials = 0
         while not hasgoal:
-            event = self._reset_objects()
+            if (reuse or numtrials > 0) and len(good_seeds) > 0:
+                # A fresh spawn has no goal, fall back to a known good one instead of retrying
+                event = self._reset_objects(self.random.choice(good_seeds))
+            else:
+                event = self._reset_objects()
             for o in event.metadata['objects']:
                 tp = self._get_object_type(o)
                 if tp in self.goals:
@@ -105,13 +235,26 @@ class EnvBase(gym.Env):
 
             numtrials += 1            
 
+        if self._last_spawn_seed not in good_seeds:
+            good_seeds.append(self._last_spawn_seed)
+            if len(good_seeds) > MAX_SPAWN_SEEDS:
+                good_seeds.pop(0)
         return event
 
     def _finish_step(self, event):
         done = self._has_finished(event)
         reward = 0 if not done else 1.0
-        return self.observe(event), reward, done, dict()
+        return self.observe(event), reward, done, self._step_info()
+
+    def _step_info(self):
+        info = dict()
+        if self._report_reset_timings:
+            # Reported once per episode, with the first step
+            info['reset_timings'] = self.reset_timings
+            self._report_reset_timings = False
+        return info
 
     def stop(self):
         if self._was_started:
-            self.controller.stop()
+            for controller in list(self._scene_controllers.values()) + self._idle_controllers:
+                controller.stop()
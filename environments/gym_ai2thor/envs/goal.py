@@ -5,139 +5,60 @@ import cv2
 import random
 import numpy as np
 import download
+from ...goal_shards import GoalShards
+from ...goal_catalog import GoalCatalog
+from ...goal_image_cache import GoalImageCache as GoalImageCacheBase, dataset_hash
+from ...util import SharedArrayStore, GoalPrefetcher
 
 DEFAULT_GOALS = [
     "ottoman", "laptop", "vase", "sofa", "plunger", "soapbottle", "apple", "knife", "ladle", "towel", "kettle", "bowl", "watch", "chair", "window", "potato", "safe", "spatula", "bottle", "boots", "cabinet", "handtowel", "laundryhamper", "tissuebox", "microwave", "painting", "pillow", "toiletpaperroll", "candle", "box", "bread", "cup", "egg", "toiletpaper", "lettuce", "television", "wateringcan", "spoon", "toaster", "plate", "winebottle", "cloth", "dresser", "stove burner", "televisionarmchair", "toilet", "drawer", "teddybear", "statue", "fridge", "pan", "alarmclock", "dishsponge", "shelf", "baseballbat", "stove knob", "sink", "coffeemachine", "garbagecan", "pot", "desklamp", "book", "scrubbrush", "houseplant", "poster", "pillowarmchair", "tennisracket", "towelholder", "mug"
 ]
 
 
-class GoalImageCache:
-    def __init__(self, image_size):
-        self.scenes = dict()
-        self.cache = dict()
-        self.image_size = image_size
-        self.random = random.Random()
-        pass
-
-    def seed(self, seed = None):
-        self.random.seed(seed)
-
-    def sample_image(self, collection):
-        return self.random.choice([x[:-len('-render_rgb.png')] for x in collection if x.endswith('-render_rgb.png')])
-
-    def fetch_scene(self, scene):
-        if not scene in self.scenes:
-            self.scenes[scene] = sceneobj = dict(
-                path = os.path.join(download.downloader.resources_path, 'thor-scene-images-' + str(scene), 'images'),
-                resources = dict()
-
-            )
-            
-            sceneobj['available_goals'] = os.listdir(sceneobj['path'])
-
-        return self.scenes[scene]
-
-    def all_goals(self, scene):
-        return self.fetch_scene(scene)['available_goals']
-
-    def read_image(self, impath):
-        try:
-            image = cv2.imread(impath)
-            image = cv2.resize(image, self.image_size, interpolation = cv2.INTER_CUBIC)
-        except Exception as e:
-            print('ERROR: wrong image %s' % impath)
-            raise e
-        return image
-
-    def fetch_image(self, root, scene, resource, sampled_image):
-        if (scene, resource, sampled_image) in self.cache:
-            return self.cache[(scene, resource, sampled_image)]
-
-        impath = os.path.join(root, sampled_image)
-        assert os.path.isfile(impath), ('Missing file %s' % impath)
-        image = self.read_image(impath)
-        self.cache[(scene, resource, sampled_image)] = image
-        return image
-
-    def fetch_resource(self, scene, resource):
-        self.fetch_scene(scene)
-        if not resource in self.scenes[scene]['resources']:
-            root = os.path.join(self.scenes[scene]['path'], resource)
-            images = os.listdir(root)
-            self.scenes[scene]['resources'][resource] = dict(
-                root = root,
-                images = images
-            )
-        else:
-            row = self.scenes[scene]['resources'][resource]
-            root, images = row['root'], row['images']
-
-        return root, images
-
-    def enumerate_all_paths(self):
-        for d in os.listdir(download.downloader.resources_path):
-            if not d.startswith('thor-scene-images-'):
-                continue
-
-            pdirectory = os.path.join(download.downloader.resources_path, d)
-            for d2name in os.listdir(pdirectory):
-                yield os.path.join(pdirectory, d2name)
-
-    def all_image_paths(self, modes = ['rgb']):
-        for d in self.enumerate_all_paths():
-            for i in range(20):
-                if not os.path.isfile(os.path.join(d, 'loc_%s-render_rgb.png' % i)):
-                    continue
-
-                ret = tuple()
-                if 'rgb' in modes:
-                    ret = ret + (os.path.join(d, 'loc_%s-render_rgb.png' % i),)
-
-                if 'depth' in modes:
-                    ret = ret + (os.path.join(d, 'loc_%s-render_depth.png' % i),)
-
-                if 'segmentation' in modes:
-                    ret = ret + (os.path.join(d, 'loc_%s-render_semantic.png' % i),)
-                yield ret
-
-    def all_images(self, modes = ['rgb']):
-        for impaths in self.all_image_paths(modes):
-            yield tuple(map(self.read_image, impaths))
-
-    def fetch_random(self, scene, resource):
-        root, images = self.fetch_resource(scene, resource)       
-        sampled_image = self.sample_image(images)        
-        return self.fetch_image(root, scene, resource, sampled_image + '-render_rgb.png'), os.path.join(root, sampled_image)
-
-    def fetch_random_with_semantic(self, scene, resource):
-        root, images = self.fetch_resource(scene, resource)       
-        sampled_image = self.sample_image(images)        
-        return (
-            self.fetch_image(root, scene, resource, sampled_image + '-render_rgb.png'),
-            self.fetch_image(root, scene, resource, sampled_image + '-render_semantic.png')
-        ), os.path.join(root, sampled_image)
+class GoalImageCache(GoalImageCacheBase):
+    def __init__(self, image_size, cache_bytes = 256 * 1024 * 1024, shared_cache = False):
+        root = download.downloader.resources_path
+        # Goal images packed by build-goal-shards.py are used when available
+        super().__init__(image_size,
+            shards = GoalShards(os.path.join(root, 'thor-goal-shards'), image_size),
+            catalog = GoalCatalog(root, os.path.join(root, 'thor-scene-images.catalog.pkl'),
+                scene_prefix = 'thor-scene-images-', scene_subdir = 'images'),
+            shared_store = SharedArrayStore('thor-goal-images-%s-%sx%s' % (dataset_hash(root), image_size[0], image_size[1])) if shared_cache else None,
+            cache_bytes = cache_bytes)
 
 class GoalEnvBase(EnvBase):
-    def __init__(self, scenes, screen_size = (224, 224), goals = [], **kwargs):
+    def __init__(self, scenes, screen_size = (224, 224), goals = [], goal_cache_bytes = 256 * 1024 * 1024, shared_goal_cache = False, prefetch_goals = True, **kwargs):
         if len(goals) == 0:
             goals = list(DEFAULT_GOALS)
 
-        self.goal_source = GoalImageCache(screen_size)
+        self.goal_source = GoalImageCache(screen_size, cache_bytes = goal_cache_bytes, shared_cache = shared_goal_cache)
+        # Goals of the next episode are sampled and decoded while the current one runs
+        self.goal_prefetcher = GoalPrefetcher(prefetch_goals)
+        self.goal_image_path = None
         super().__init__(scenes, screen_size=screen_size, goals=goals, **kwargs)        
+
+    def seed(self, seed = None):
+        self.goal_prefetcher.clear()
+        self.random.seed(seed)
+        self.goal_source.seed(seed)
+        return [seed]
     
-    def _has_finished(self, event):
-        for o in event.metadata['objects']:
-            tp = self._get_object_type(o)
-            if tp == self.goal and o['distance'] < self.treshold_distance:
-                return True
-        
-        return False
+    def _goal_types(self):
+        return [self.goal]
+
+    def _step_info(self):
+        report = self._report_reset_timings
+        info = super()._step_info()
+        if report:
+            info['goal_cache'] = self.goal_source.cache_stats
+        return info
 
     def _render_goal(self, scene, goal):
+        """Returns the goal observation and the path of the goal image"""
         return self.goal_source.fetch_random(scene, goal)
 
     def _pick_goal(self, event, scene):
-        allgoals = set(self.goal_source.all_goals(scene))
+        allgoals = set(self.goal_prefetcher.call(lambda: self.goal_source.all_goals(scene)))
         allgoals.intersection_update(set(self.goals))            
 
         # Resamples if no goals are available
@@ -149,8 +70,14 @@ class GoalEnvBase(EnvBase):
             if tp in allgoals:
                 goals.add(tp)
 
-        self.goal = self.random.choice(list(goals))
-        self.goal_observation = self._render_goal(scene, self.goal)
+        # The objects of a scene rarely change between episodes, so the goal for
+        # the same set of visible goal types is prepared ahead of time
+        goals = sorted(goals)
+        def sample():
+            goal = self.goal_source.random.choice(goals)
+            return goal, self._render_goal(scene, goal)
+
+        self.goal, (self.goal_observation, self.goal_image_path) = self.goal_prefetcher.take((scene, tuple(goals)), sample)
         return event
 
     def observe(self, event = None):
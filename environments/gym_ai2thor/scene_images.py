@@ -0,0 +1,352 @@
+import os
+import json
+import time
+import hashlib
+import multiprocessing
+from itertools import product
+import numpy as np
+import cv2
+from ..goal_shards import GOAL_SHARDS_VERSION, MODES
+from ..util import depth_to_uint8
+
+PLAYER_SIZE = 300
+ZOOM_SIZE = 1000
+TARGET_SIZE = 256
+ROTATIONS = [0, 90, 180, 270]
+HORIZONS = [330, 0, 30]
+BUFFER = 15
+# object must be at least 40% in view
+MIN_SIZE = ((TARGET_SIZE * 0.4) / ZOOM_SIZE) * PLAYER_SIZE
+
+
+def _color_key(color):
+    return (int(color[0]) << 16) | (int(color[1]) << 8) | int(color[2])
+
+
+def object_bounding_boxes(instance_frame, colors):
+    """Returns bounding boxes (min_y, min_x, max_y, max_x) of the given colors
+
+    All boxes are computed in a single pass over the instance segmentation frame,
+    colors missing in the frame are not returned.
+    """
+    frame = instance_frame.astype(np.int32)
+    keys = (frame[..., 0] << 16) | (frame[..., 1] << 8) | frame[..., 2]
+    colors = { _color_key(x): tuple(x) for x in colors }
+    ys, xs = np.nonzero(np.isin(keys, np.array(list(colors.keys()), dtype = np.int32)))
+    if len(ys) == 0:
+        return dict()
+
+    labels = keys[ys, xs]
+    order = np.argsort(labels, kind = 'stable')
+    labels, ys, xs = labels[order], ys[order], xs[order]
+    found, starts = np.unique(labels, return_index = True)
+    boxes = zip(np.minimum.reduceat(ys, starts), np.minimum.reduceat(xs, starts), np.maximum.reduceat(ys, starts), np.maximum.reduceat(xs, starts))
+    return { colors[key]: tuple(int(v) for v in box) for key, box in zip(found, boxes) }
+
+
+def find_visible_objects(event):
+    objects = [o for o in event.metadata['objects'] if o['visible'] and o['objectId'] and o['pickupable'] and o['objectId'] in event.object_id_to_color]
+    boxes = object_bounding_boxes(event.instance_segmentation_frame, [event.object_id_to_color[o['objectId']] for o in objects])
+    visible_objects = []
+    for o in objects:
+        box = boxes.get(tuple(event.object_id_to_color[o['objectId']]))
+        if box is None:
+            continue
+
+        min_y, min_x, max_y, max_x = box
+        max_dim = max((max_y - min_y), (max_x - min_x))
+        if max_dim > MIN_SIZE and min_y > BUFFER and min_x > BUFFER and max_x < (PLAYER_SIZE - BUFFER) and max_y < (PLAYER_SIZE - BUFFER):
+            visible_objects.append(dict(objectId=o['objectId'], min_x=min_x, min_y=min_y, max_x=max_x, max_y=max_y))
+    return visible_objects
+
+
+def _start_controller(scene_name, size, quality = None, **kwargs):
+    import ai2thor.controller
+    env = ai2thor.controller.Controller(quality=quality) if quality is not None else ai2thor.controller.Controller()
+    env.start(player_screen_width=size, player_screen_height=size)
+    env.reset(scene_name)
+    event = env.step(dict(action='Initialize', gridSize=0.25, **kwargs))
+
+    for o in event.metadata['objects']:
+        if o['receptacle'] and o['receptacleObjectIds'] and o['openable']:
+            env.step(dict(action='OpenObject', objectId=o['objectId'], forceAction=True))
+    return env
+
+
+def _teleport(env, point, rotation, horizon):
+    return env.step(dict(action='TeleportFull', x=point['x'], y=point['y'], z=point['z'], rotation=rotation, horizon=horizon, forceAction=True), raise_for_failure=True)
+
+
+def find_object_locations(scene_name):
+    """Finds all reachable poses with well visible pickupable objects"""
+    env = _start_controller(scene_name, PLAYER_SIZE, quality='Low', renderObjectImage=True, renderClassImage=False, renderImage=False)
+    event = env.step(dict(action='GetReachablePositions', gridSize=0.25))
+
+    visible_object_locations = []
+    for point in event.metadata['actionReturn']:
+        for rot, hor in product(ROTATIONS, HORIZONS):
+            event = _teleport(env, point, rot, hor)
+            visible_objects = find_visible_objects(event)
+            if visible_objects:
+                visible_object_locations.append(dict(point=point, rot=rot, hor=hor, visible_objects=visible_objects))
+
+    env.stop()
+    return visible_object_locations
+
+
+def crop_object(event, point, v):
+    """Returns the goal, the sample name and the rgb, depth and semantic crops of a visible object"""
+    scale = ZOOM_SIZE / PLAYER_SIZE
+    min_y = int(round(v['min_y'] * scale))
+    max_y = int(round(v['max_y'] * scale))
+    max_x = int(round(v['max_x'] * scale))
+    min_x = int(round(v['min_x'] * scale))
+    delta_y = max_y - min_y
+    delta_x = max_x - min_x
+    scaled_target_size = max(delta_x, delta_y, TARGET_SIZE) + BUFFER * 2
+    if min_x > (ZOOM_SIZE - max_x):
+        start_x = min_x - (scaled_target_size - delta_x)
+        end_x = max_x + BUFFER
+    else:
+        end_x = max_x + (scaled_target_size - delta_x)
+        start_x = min_x - BUFFER
+
+    if min_y > (ZOOM_SIZE - max_y):
+        start_y = min_y - (scaled_target_size - delta_y)
+        end_y = max_y + BUFFER
+    else:
+        end_y = max_y + (scaled_target_size - delta_y)
+        start_y = min_y - BUFFER
+
+    img = event.cv2img[start_y: end_y, start_x:end_x, :]
+    rgb = cv2.resize(img, (TARGET_SIZE, TARGET_SIZE), interpolation = cv2.INTER_LANCZOS4)
+    depth = depth_to_uint8(event.depth_frame[start_y: end_y, start_x:end_x])
+    depth = cv2.resize(depth, (TARGET_SIZE, TARGET_SIZE), interpolation=cv2.INTER_CUBIC)
+    semantic = cv2.resize(event.class_segmentation_frame[start_y: end_y, start_x:end_x, :],
+        (TARGET_SIZE, TARGET_SIZE), interpolation=cv2.INTER_NEAREST)
+
+    h = hashlib.md5()
+    h.update(json.dumps(point, sort_keys=True).encode('utf8'))
+    h.update(json.dumps(v, sort_keys=True).encode('utf8'))
+    return v['objectId'].split('|')[0].lower(), h.hexdigest(), (rgb, depth, semantic)
+
+
+class PngSceneWriter:
+    """Writes <base_path>/images/<goal>/<sample>-render_<mode>.png"""
+    def __init__(self, base_path):
+        self.base_path = base_path
+
+    def write(self, goal, sample, images):
+        target_dir = os.path.join(self.base_path, 'images', goal)
+        os.makedirs(target_dir, exist_ok=True)
+        for mode, image in zip(MODES, images):
+            cv2.imwrite(os.path.join(target_dir, '%s-render_%s.png' % (sample, mode)), image)
+
+    def flush(self):
+        pass
+
+    def close(self, samples):
+        pass
+
+
+class ShardSceneWriter:
+    """Appends the images to goal shards of the scene, see `GoalShards`
+
+    The images are resized like in `build_scene_shard`. The index is written
+    when the scene is finished, so readers never see partial shards.
+    """
+    def __init__(self, output_paths, samples):
+        self.output_paths = output_paths
+        self._files = dict()
+        for image_size, path in output_paths.items():
+            os.makedirs(path, exist_ok = True)
+            row_size = image_size[0] * image_size[1] * 3
+            for mode in MODES:
+                filename = os.path.join(path, '%s.u8' % mode)
+                f = open(filename, 'ab')
+                if f.tell() < len(samples) * row_size:
+                    f.close()
+                    raise Exception('Shard file %s is shorter than its recorded progress, remove the progress of the scene to render it again' % filename)
+
+                # Drop the rows of an interrupted location
+                f.truncate(len(samples) * row_size)
+                f.seek(0, os.SEEK_END)
+                self._files[(image_size, mode)] = f
+
+    def write(self, goal, sample, images):
+        for mode, image in zip(MODES, images):
+            if len(image.shape) == 2:
+                image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+            for image_size in self.output_paths.keys():
+                resized = cv2.resize(image, tuple(image_size), interpolation = cv2.INTER_CUBIC)
+                self._files[(image_size, mode)].write(np.ascontiguousarray(resized, dtype = np.uint8).tobytes())
+
+    def flush(self):
+        for f in self._files.values():
+            f.flush()
+            os.fsync(f.fileno())
+
+    def close(self, samples):
+        for f in self._files.values():
+            f.close()
+
+        goals = dict()
+        for i, (goal, sample) in enumerate(samples):
+            goals.setdefault(goal, dict())[sample] = i
+        for image_size, path in self.output_paths.items():
+            width, height = image_size
+            index = dict(version = GOAL_SHARDS_VERSION, image_size = list(image_size), shape = [len(samples), height, width, 3], modes = list(MODES), goals = goals)
+            tmp_path = os.path.join(path, 'index.json.%s.tmp' % os.getpid())
+            with open(tmp_path, 'w') as f:
+                json.dump(index, f)
+            os.replace(tmp_path, os.path.join(path, 'index.json'))
+
+
+def _read_progress(path):
+    progress = dict()
+    if not os.path.isfile(path):
+        return progress
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # Truncated last line
+                break
+            progress[entry['location']] = entry['samples']
+    return progress
+
+
+def _scene_outputs(shard_paths = None):
+    """Returns the outputs of a scene as (name, shard paths), every output has its own progress"""
+    if shard_paths is None:
+        return [('png', None)]
+    return [('shards-%sx%s' % tuple(size), { size: path }) for size, path in sorted(shard_paths.items())]
+
+
+def _complete_path(base_path, name):
+    return os.path.join(base_path, '.complete-%s' % name)
+
+
+def _migrate_legacy_png(base_path):
+    # Scenes rendered before the outputs were split only have .complete and progress.jsonl, both for png files
+    for legacy, name in (('.complete', '.complete-png'), ('progress.jsonl', 'progress-png.jsonl')):
+        legacy, name = os.path.join(base_path, legacy), os.path.join(base_path, name)
+        if os.path.isfile(legacy) and not os.path.exists(name):
+            try:
+                os.replace(legacy, name)
+            except FileNotFoundError:
+                # Migrated by another process
+                pass
+
+
+def _is_output_complete(base_path, name):
+    if name == 'png':
+        _migrate_legacy_png(base_path)
+    return os.path.isfile(_complete_path(base_path, name))
+
+
+def _is_complete(base_path, shard_paths = None):
+    return all(_is_output_complete(base_path, name) for name, _ in _scene_outputs(shard_paths))
+
+
+def render_scene_images(base_path, scene_name, shard_paths = None):
+    """Renders goal images of all well visible objects of a scene
+
+    The work is checkpointed after every location, an interrupted scene
+    continues where it stopped. With shard_paths (a dict mapping the image size
+    to the scene shard directory) the images are packed into goal shards
+    instead of being written as png files. The png files and every shard size
+    have their own progress-<output>.jsonl and .complete-<output> files, so
+    a location is rendered only for the outputs that miss it.
+    """
+    os.makedirs(base_path, exist_ok=True)
+    outputs = []
+    for name, paths in _scene_outputs(shard_paths):
+        if _is_output_complete(base_path, name):
+            continue
+        progress_path = os.path.join(base_path, 'progress-%s.jsonl' % name)
+        progress = _read_progress(progress_path)
+        samples = [tuple(x) for i in sorted(progress.keys()) for x in progress[i]]
+        writer = ShardSceneWriter(paths, samples) if paths is not None else PngSceneWriter(base_path)
+        outputs.append(dict(name = name, writer = writer, progress_path = progress_path, progress = progress, samples = samples))
+
+    if len(outputs) == 0:
+        return scene_name
+
+    locations_path = os.path.join(base_path, 'locations.json')
+    if os.path.isfile(locations_path):
+        with open(locations_path, 'r') as f:
+            locations = json.load(f)
+    else:
+        locations = find_object_locations(scene_name)
+        with open(locations_path + '.tmp', 'w') as f:
+            json.dump(locations, f)
+        os.replace(locations_path + '.tmp', locations_path)
+
+    if any(len(x['progress']) < len(locations) for x in outputs):
+        env = _start_controller(scene_name, ZOOM_SIZE, renderClassImage = True, renderDepthImage = True)
+        files = [open(x['progress_path'], 'a') for x in outputs]
+        try:
+            for i, vol in enumerate(locations):
+                pending = [(x, f) for x, f in zip(outputs, files) if i not in x['progress']]
+                if len(pending) == 0:
+                    continue
+
+                event = _teleport(env, vol['point'], vol['rot'], vol['hor'])
+                location_samples = []
+                for v in vol['visible_objects']:
+                    goal, sample, images = crop_object(event, vol['point'], v)
+                    for x, _ in pending:
+                        x['writer'].write(goal, sample, images)
+                    location_samples.append((goal, sample))
+
+                for x, f in pending:
+                    x['writer'].flush()
+                    f.write(json.dumps(dict(location = i, samples = location_samples)) + '\n')
+                    f.flush()
+                    x['samples'].extend(location_samples)
+        finally:
+            for f in files:
+                f.close()
+        env.stop()
+
+    for x in outputs:
+        x['writer'].close(x['samples'])
+        open(_complete_path(base_path, x['name']), 'a').close()
+    return scene_name
+
+
+def _render_scene_images(args):
+    return render_scene_images(*args)
+
+
+def generate_scene_images(scenes, processes = None, shard_root = None, shard_sizes = [(84, 84)]):
+    """Renders goal images of many scenes in a process pool
+
+    Args:
+        scenes: a dict mapping the scene (e.g. '311') to the pair (resource path, THOR scene name)
+        shard_root: when set, the images are packed into shards under this root, see `GoalShards`
+    """
+    from ..goal_shards import scene_shard_path
+    jobs = []
+    for scene, (base_path, scene_name) in sorted(scenes.items()):
+        shard_paths = None
+        if shard_root is not None:
+            shard_paths = { tuple(x): scene_shard_path(shard_root, x, scene) for x in shard_sizes }
+        if _is_complete(base_path, shard_paths):
+            continue
+        jobs.append((base_path, scene_name, shard_paths))
+
+    if len(jobs) == 0:
+        return
+
+    print('Rendering goal images of %s scenes ...' % len(jobs))
+    ts = time.time()
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    # Every scene runs in a fresh process, THOR controllers do not release all resources
+    with multiprocessing.Pool(max(1, min(processes, len(jobs))), maxtasksperchild = 1) as pool:
+        for scene_name in pool.imap_unordered(_render_scene_images, jobs):
+            print('  >> %s finished' % scene_name)
+    print('  >> Done! Time Elapsed = %.4f(s)' % (time.time() - ts))
@@ -1,6 +1,7 @@
 import os
 from os.path import expanduser
 from graph.util import load_graph, dump_graph
+from ..util import file_lock
 
 def thor_generator(scene, screen_size, goals, seed = 1, grid_size = 0.5, cameraY = 0.675):
     def _thunk():
@@ -12,6 +13,13 @@ def thor_generator(scene, screen_size, goals, seed = 1, grid_size = 0.5, cameraY
         return graph
     return _thunk
 
+def house_generator(house_id, screen_size, room_types = ['kitchen'], grid_size = 0.5):
+    def _thunk():
+        import graph.house_graph
+        reconstructor = graph.house_graph.HouseGridWorldReconstructor(house_id, room_types = room_types, screen_size = screen_size, grid_size = grid_size)
+        return reconstructor.reconstruct()
+    return _thunk
+
 
 graph_generators = {}
 '''    'kitchen-224': thor_generator('FloorPlan28', (224, 224,), (7, 0)),
@@ -28,30 +36,50 @@ graph_generators['thor-cached-208-174'] = thor_generator('FloorPlan208', (174, 1
 graph_generators['thor-cached-218-174'] = thor_generator('FloorPlan218', (174, 174), grid_size = 0.33, cameraY = 0.3, goals = [(6, 22, 1), (7, 0, 0), (18, 18, 3), (13, 31, 3)])
 graph_generators['thor-cached-225-174'] = thor_generator('FloorPlan225', (174, 174), grid_size = 0.33, cameraY = 0.3, goals = [(3, 17, 2), (12, 17, 3), (15, 10, 0), (14, 8, 3)])
 
+def register_house_graphs(house_ids, screen_size = (84, 84), room_types = ['kitchen']):
+    """Registers house-cached-<id> graphs reconstructed from House3D houses, returns their names"""
+    names = []
+    for house_id in house_ids:
+        name = 'house-cached-%s' % house_id[:8]
+        graph_generators[name] = house_generator(house_id, screen_size, room_types = room_types)
+        names.append(name)
+    return names
+
 def _to_pascal(text):
     return ''.join(map(lambda x: x.capitalize(), text.split('-')))
 
 def available_scenes():
     return [(_to_pascal(x), x) for x in graph_generators.keys()]
 
-def get_graph(graph):
-    home = expanduser("~")
-    basepath = os.path.join(home, '.visual_navigation', 'scenes')
-    if not os.path.exists(basepath):
-        os.makedirs(basepath)
-
-    filename = os.path.join(basepath, '%s.pkl' % graph)
-    if not os.path.exists(filename):
-        graph = graph_generators.get(graph)()        
-        with open(filename, 'wb+') as f:
+def graph_path(graph):
+    return os.path.join(expanduser("~"), '.visual_navigation', 'scenes', '%s.pkl' % graph)
+
+def build_graph(graph):
+    """Generates the scene file if it does not exist, returns True if it was generated"""
+    filename = graph_path(graph)
+    os.makedirs(os.path.dirname(filename), exist_ok = True)
+    if os.path.exists(filename):
+        return False
+
+    # Concurrent workers wait for the one generating the scene
+    with file_lock(filename + '.lock'):
+        if os.path.exists(filename):
+            return False
+        graph = graph_generators.get(graph)()
+        tmp_filename = '%s.%s.tmp' % (filename, os.getpid())
+        with open(tmp_filename, 'wb+') as f:
             dump_graph(graph, f)
             f.flush()
+        os.replace(tmp_filename, filename)
+    return True
 
-    with open(filename, 'rb') as f:
+def get_graph(graph):
+    build_graph(graph)
+    with open(graph_path(graph), 'rb') as f:
         graph = load_graph(f)
 
     return graph
 
 def download_all():
     for graph in graph_generators.keys():
-        get_graph(graph)
+        build_graph(graph)
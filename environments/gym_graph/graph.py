@@ -4,6 +4,7 @@ import gym.spaces
 from graph.core import GraphResize
 from graph.util import load_graph, step, sample_initial_state, is_valid_state
 from .download import get_graph
+from ..util import AuxiliaryTargetMixin
 import random
 
 class OrientedGraphEnv(gym.Env):
@@ -93,28 +94,32 @@ class OrientedGraphEnv(gym.Env):
             raise Exception("Render mode %s is not supported" % mode)
 
 
-class GoalGymGraphAuxiliaryEnv(OrientedGraphEnv):
-    def __init__(self, goals = None, screen_size = (174, 174,), **kwargs):
+class GoalGymGraphAuxiliaryEnv(AuxiliaryTargetMixin, OrientedGraphEnv):
+    def __init__(self, goals = None, screen_size = (174, 174,), auxiliary_target_size = None, auxiliary_cell_size = 4, **kwargs):
         super().__init__(goals = goals, **kwargs)
 
         self.screen_size = screen_size
+
+        self._set_auxiliary_target(auxiliary_target_size, auxiliary_cell_size)
+        target_size = self.auxiliary_target_shape
         self.observation_space = gym.spaces.Tuple((
             self.observation_space,
             gym.spaces.Box(0, 255, self.screen_size + (3,), dtype = np.uint8),
-            gym.spaces.Box(0, 255, self.screen_size + (1,), dtype = np.uint8),
-            gym.spaces.Box(0, 255, self.screen_size + (3,), dtype = np.uint8),
-            gym.spaces.Box(0, 255, self.screen_size + (3,), dtype = np.uint8)))
+            gym.spaces.Box(0, 255, target_size + (1,), dtype = np.uint8),
+            gym.spaces.Box(0, 255, target_size + (3,), dtype = np.uint8),
+            gym.spaces.Box(0, 255, target_size + (3,), dtype = np.uint8)))
 
         self._cached_goal = (None, None)
 
     def render_goal(self):
         cached, value = self._cached_goal
         if cached is None or cached != self.goal:
-            value = self.graph.render(self.goal[:2], self.goal[2], modes = ['rgb','segmentation'])
+            goal_rgb, goal_segmentation = self.graph.render(self.goal[:2], self.goal[2], modes = ['rgb','segmentation'])
+            value = (goal_rgb, self._auxiliary_target(goal_segmentation))
             self._cached_goal = (self.goal, value,)
         return value
 
     def observe(self, state):
         goal_rgb, goal_segmentation = self.render_goal()
         rgb, depth, segmation = self.graph.render(state[:2], state[2], modes = ['rgb','depth', 'segmentation'])
-        return (rgb, goal_rgb, depth, segmation, goal_segmentation)
+        return (rgb, goal_rgb, self._auxiliary_target(depth), self._auxiliary_target(segmation), goal_segmentation)
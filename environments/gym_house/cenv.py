@@ -19,6 +19,8 @@ from House3D.core import Environment
 from .multi import MultiHouseEnv
 from House3D.objrender import RenderAPIThread as RenderAPI
 from .goal import GoalImageCache
+from .house_cache import set_target_room
+from ..util import AuxiliaryTargetMixin, GoalPrefetcher, LRUCache, SharedArrayStore
 
 ###############################################
 # Task related definitions and configurations
@@ -42,6 +44,11 @@ discrete_actions=[(1.,0.,0.), (0.,0.7,0.), (0.,-0.7,0.),
                   #(0.4,0.,0.), (0.,0.,0.4), (0.,0.,-0.4)]
 n_discrete_actions = len(discrete_actions)
 
+# rounding of the camera pose used by the render cache, only absorbs the float error
+# of poses reached by different action sequences (birth yaws are snapped to the rotation step)
+render_cache_position_step = 0.001  # meters
+render_cache_yaw_step = 0.001  # degrees
+
 
 #################
 # Util Functions
@@ -67,7 +74,10 @@ class RoomNavTask(gym.Env):
                  enable_noise = False,
                  max_steps=-1,
                  success_measure='see',
-                 discrete_action=False):
+                 discrete_action=False,
+                 render_cache_bytes = None,
+                 render_cache_path = None,
+                 render_cache_disk_bytes = None):
         """RoomNav task wrapper with gym api
         Note:
             all the settings are the default setting to run a task
@@ -88,6 +98,14 @@ class RoomNavTask(gym.Env):
             max_steps (int, optional): when max_steps > 0, the task will be cut after <max_steps> steps
             success_measure (str, optional): criteria for success, currently support 'see' and 'stay'
             discrete_action (bool, optional):  when true, use discrete actions; otherwise use continuous actions
+            render_cache_bytes (int, optional): when not None and the noise is disabled, rendered frames are cached
+                                                by the camera pose using at most this many bytes, the birth
+                                                yaw is then a multiple of the rotation step, so poses repeat
+            render_cache_path (str, optional): directory of a persistent render cache shared by all runs
+            render_cache_disk_bytes (int, optional): maximum size of the persistent render cache, it is only used
+                                                     when both this and render_cache_path are set. Almost all hits
+                                                     are revisits inside an episode served by the memory cache,
+                                                     poses repeat across episodes for well under 1% of the steps
         """
         self.env = env
         assert isinstance(env, Environment), '[RoomNavTask] env must be an instance of Environment!'
@@ -100,10 +118,8 @@ class RoomNavTask(gym.Env):
         self.joint_visual_signal = joint_visual_signal
         self.depth_signal = depth_signal
         n_channel = 3
-        if segment_input:
-            self.env.set_render_mode('semantic')
-        else:
-            self.env.set_render_mode('rgb')
+        self._render_mode = 'semantic' if segment_input else 'rgb'
+        self.env.set_render_mode(self._render_mode)
         if joint_visual_signal: n_channel += 3
         if depth_signal: n_channel += 1
         self._observation_shape = (resolution[0], resolution[1], n_channel)
@@ -132,11 +148,20 @@ class RoomNavTask(gym.Env):
         self.last_obs = None
         self.last_info = None
         self._object_cnt = 0
+        self._frames = dict()
+
+        # Without noise the agent moves in fixed increments, so the poses repeat across episodes
+        self.render_cache = None
+        self.render_cache_disk = None
+        self.render_cache_stats = dict(hits = 0, disk_hits = 0, misses = 0)
+        if not enable_noise and render_cache_bytes is not None:
+            self.render_cache = LRUCache(max_bytes = render_cache_bytes)
+            if render_cache_path is not None and render_cache_disk_bytes is not None:
+                self.render_cache_disk = SharedArrayStore('%sx%s' % tuple(resolution), max_bytes = render_cache_disk_bytes, root = render_cache_path)
 
         # config hardness
         self.hardness = None
         self.availCoors = None
-        self._availCoorsDict = None
         self.reset_hardness(hardness)
 
         # temp storage
@@ -170,18 +195,32 @@ class RoomNavTask(gym.Env):
     """
     def reset_target(self, target):
         assert target in self.house.all_desired_roomTypes, '[RoomNavTask] desired target <{}> does not exist in the house<{}>!'.format(target, self.house.objFile)
-        if self.house.setTargetRoom(target):  # target room changed!!!
-            _id = self.house._id
-            if self.house.targetRoomTp not in self._availCoorsDict[_id]:
-                if self.hardness is None:
-                    self.availCoors = self.house.connectedCoors
-                else:
-                    allowed_dist = self.house.maxConnDist * self.hardness
-                    self.availCoors = [c for c in self.house.connectedCoors
-                                       if self.house.connMap[c[0], c[1]] <= allowed_dist]
-                self._availCoorsDict[_id][self.house.targetRoomTp] = self.availCoors
-            else:
-                self.availCoors = self._availCoorsDict[_id][self.house.targetRoomTp]
+        if set_target_room(self.house, target, self.env.config):  # target room changed!!!
+            self._update_avail_coors()
+
+    def _get_coors_index(self):
+        """Returns connected coordinates of the current target sorted by their distance
+
+        The index only depends on the house and the target room type, therefore
+        it survives hardness changes and house switches. It is stored on the house,
+        so it is released together with the house when the house is evicted.
+        """
+        index = self.house.__dict__.setdefault('_coors_index', dict())
+        key = self.house.targetRoomTp
+        if key not in index:
+            coors = np.array(self.house.connectedCoors, dtype = np.int32).reshape(-1, 2)
+            dists = self.house.connMap[coors[:, 0], coors[:, 1]]
+            order = np.argsort(dists, kind = 'stable')
+            index[key] = (coors[order], dists[order], self.house.maxConnDist)
+        return index[key]
+
+    def _update_avail_coors(self):
+        coors, dists, max_dist = self._get_coors_index()
+        if self.hardness is None:
+            self.availCoors = coors
+        else:
+            allowed_dist = max_dist * self.hardness
+            self.availCoors = coors[:np.searchsorted(dists, allowed_dist, side = 'right')]
 
     @property
     def house(self):
@@ -208,20 +247,80 @@ class RoomNavTask(gym.Env):
         # generate state
         if state == None:
             state = self.house.to_coor(gx, gy, True)
+            if self.render_cache is not None:
+                # On the rotation grid the poses repeat and the rendered frames can be reused
+                state = tuple(state) + (random.randrange(0, 360, self.rot_sensitivity),)
 
         self.env.reset(*state)
-        self.last_obs = self.env.render()
-        if self.joint_visual_signal:
-            self.last_obs = np.concatenate([self.env.render(mode='rgb'), self.last_obs], axis=-1)
+        self._frames = dict()
+        self.last_obs = self._observe()
         ret_obs = self.last_obs
         if self.depth_signal:
-            dep_sig = self.env.render(mode='depth')
-            if dep_sig.shape[-1] > 1:
-                dep_sig = dep_sig[..., 0:1]
-            ret_obs = np.concatenate([ret_obs, dep_sig], axis=-1)
+            ret_obs = np.concatenate([ret_obs, self.frame('depth')], axis=-1)
         self.last_info = self.info
         return ret_obs
 
+    def frame(self, mode):
+        """Returns the frame of the given modality for the current camera pose
+
+        Each modality is rendered at most once between two actions, the result is
+        memoized and shared by observation construction, success checking and
+        any wrapper asking for auxiliary modalities.
+        """
+        if mode not in self._frames:
+            if self.render_cache is not None:
+                self._frames[mode] = self._cached_render(mode)
+            else:
+                self._frames[mode] = self._render(mode)
+        return self._frames[mode]
+
+    def _render(self, mode):
+        frame = self.env.render(mode = mode, copy = True)
+        if mode == 'depth' and frame.shape[-1] > 1:
+            frame = frame[..., 0:1]
+        return frame
+
+    def _render_key(self, mode):
+        cam = self.env.cam
+        house_id = os.path.basename(os.path.dirname(self.house.objFile))
+        return (house_id,
+            int(round(cam.pos.x / render_cache_position_step)),
+            int(round(cam.pos.z / render_cache_position_step)),
+            int(round(cam.yaw / render_cache_yaw_step)) % int(round(360 / render_cache_yaw_step)),
+            mode)
+
+    def _cached_render(self, mode):
+        key = self._render_key(mode)
+        frame = self.render_cache.get(key)
+        if frame is not None:
+            self.render_cache_stats['hits'] += 1
+            return np.copy(frame)
+
+        if self.render_cache_disk is not None:
+            frame = self.render_cache_disk.get(key)
+            if frame is not None:
+                self.render_cache_stats['disk_hits'] += 1
+                frame = np.array(frame)
+                self.render_cache.put(key, np.copy(frame))
+                return frame
+
+        self.render_cache_stats['misses'] += 1
+        frame = self._render(mode)
+        self.render_cache.put(key, np.copy(frame))
+        if self.render_cache_disk is not None:
+            self.render_cache_disk.put(key, frame)
+        return frame
+
+    def render_frames(self, modes):
+        """Returns a tuple of frames for all requested modalities"""
+        return tuple(self.frame(mode) for mode in modes)
+
+    def _observe(self):
+        obs = self.frame(self._render_mode)
+        if self.joint_visual_signal:
+            obs = np.concatenate([self.frame('rgb'), obs], axis=-1)
+        return obs
+
     def _apply_action(self, action):
         if self.discrete_action:
             return discrete_actions[action]
@@ -240,10 +339,7 @@ class RoomNavTask(gym.Env):
         # self.success_measure == 'see'
         flag_see_target_objects = False
         object_color_list = self.room_target_object[self.house.targetRoomTp]
-        if (self.last_obs is not None) and self.segment_input:
-            seg_obs = self.last_obs if not self.joint_visual_signal else self.last_obs[:,:,3:6]
-        else:
-            seg_obs = self.env.render(mode='semantic')
+        seg_obs = self.frame('semantic')
         self._object_cnt = 0
         for c in object_color_list:
             cur_n = np.sum(np.all(seg_obs == c, axis=2))
@@ -287,9 +383,8 @@ class RoomNavTask(gym.Env):
             if flag_print_debug_info:
                 print('Move Successfully!')
 
-        self.last_obs = obs = self.env.render()
-        if self.joint_visual_signal:
-            self.last_obs = obs = np.concatenate([self.env.render(mode='rgb'), obs], axis=-1)
+        self._frames = dict()
+        self.last_obs = obs = self._observe()
         cur_info = self.info
         raw_dist = cur_info['dist']
 
@@ -302,10 +397,7 @@ class RoomNavTask(gym.Env):
         if (self.max_steps > 0) and (self.current_episode_step >= self.max_steps): done = True
 
         if self.depth_signal:
-            dep_sig = self.env.render(mode='depth')
-            if dep_sig.shape[-1] > 1:
-                dep_sig = dep_sig[..., 0:1]
-            obs = np.concatenate([obs, dep_sig], axis=-1)
+            obs = np.concatenate([obs, self.frame('depth')], axis=-1)
         self.last_info = cur_info
         return obs, reward, done, cur_info
 
@@ -326,6 +418,8 @@ class RoomNavTask(gym.Env):
         ret['optsteps'] = int(dist / (self.move_sensitivity / self.house.grid_det) + 0.5)
         ret['collision'] = int(self.collision_flag)
         ret['target_room'] = self.house.targetRoomTp
+        if self.render_cache is not None:
+            ret['render_cache'] = dict(self.render_cache_stats)
         return ret
 
     """
@@ -348,15 +442,7 @@ class RoomNavTask(gym.Env):
             print('Setting complexity to %s' % hardness)
 
         self.hardness = hardness
-        if hardness is None:
-            self.availCoors = self.house.connectedCoors
-        else:
-            allowed_dist = self.house.maxConnDist * hardness
-            self.availCoors = [c for c in self.house.connectedCoors
-                               if self.house.connMap[c[0], c[1]] <= allowed_dist]
-        n_house = self.env.num_house
-        self._availCoorsDict = [dict() for i in range(n_house)]
-        self._availCoorsDict[self.house._id][self.house.targetRoomTp] = self.availCoors
+        self._update_avail_coors()
 
 
 from .env import create_configuration
@@ -366,7 +452,10 @@ GymHouseState = namedtuple('GymHouseState', ['house_id', 'x', 'y', 'rotation'])
 GoalGymHouseState = namedtuple('GymHouseState', ['house_id', 'target_image', 'x', 'y', 'rotation'])
 
 class GymHouseEnv(gym.Env):
-    def __init__(self, scene = '2364b7dcc432c6d6dcc59dba617b5f4b', screen_size = (84,84), goals = ['kitchen'], hardness=0.3, configuration = None, enable_noise = False):
+    def __init__(self, scene = '2364b7dcc432c6d6dcc59dba617b5f4b', screen_size = (84,84), goals = ['kitchen'], hardness=0.3, configuration = None, enable_noise = False,
+            lazy_houses = False, max_resident_houses = None, max_resident_bytes = None, prefetch_scenes = True,
+            active_scenes = None, worker_index = 0, goal_cache_bytes = 256 * 1024 * 1024, shared_goal_cache = False, prefetch_goals = True,
+            render_cache_bytes = None, render_cache_path = None, render_cache_disk_bytes = None):
         super().__init__()
 
         if isinstance(scene, (list, tuple)) and len(scene) == 1:
@@ -376,12 +465,25 @@ class GymHouseEnv(gym.Env):
         self.room_types = goals
         self.scenes = scene
         self.reset_scene_trials = 5
+        self.prefetch_scenes = prefetch_scenes
         self.enable_noise = enable_noise
         self.is_multi = not isinstance(scene, str)
         self.configuration = create_configuration(configuration)
         self.hardness = hardness
+        self.house_kwargs = dict(lazy = lazy_houses, max_resident_houses = max_resident_houses, max_resident_bytes = max_resident_bytes)
+        self.goal_cache_kwargs = dict(cache_bytes = goal_cache_bytes, shared_cache = shared_goal_cache)
+        self.render_cache_kwargs = dict(render_cache_bytes = render_cache_bytes, render_cache_path = render_cache_path, render_cache_disk_bytes = render_cache_disk_bytes)
+        # Used by the goal environments, see GoalGymHouseEnvBase
+        self.goal_prefetcher = GoalPrefetcher(prefetch_goals)
         self._env = None
 
+        # Scenes played by this worker, the scene balancer can change them
+        self.worker_index = worker_index
+        self._active_scene_ids = None
+        self._scene_stats = dict()
+        if self.is_multi:
+            self._set_active_scenes(active_scenes if active_scenes is not None else self.scenes)
+
         self.action_space = gym.spaces.Discrete(n_discrete_actions)
         self.observation_space = gym.spaces.Box(0, 255, screen_size + (3,), dtype = np.uint8)
 
@@ -396,15 +498,16 @@ class GymHouseEnv(gym.Env):
             env = Environment(api, self.scenes, self.configuration)
             env.reset()
         else:
-            env = MultiHouseEnv(api, self.scenes, self.configuration)
-            scene_id = random.randrange(len(self.scenes))
+            scene_id = random.choice(self._active_scene_ids)
+            env = MultiHouseEnv(api, list(self.scenes), self.configuration, initial_house = scene_id, **self.house_kwargs)
             self.scene = self.scenes[scene_id]
             env.reset_house(scene_id)
             env.reset()
             self._inner_env = env
             self._reset_scene_counter = self.reset_scene_trials
+            self._schedule_next_scene()
 
-        env = RoomNavTask(env, discrete_action = True, depth_signal = False, segment_input = False, hardness=self.hardness, reward_type=None, enable_noise = self.enable_noise)
+        env = RoomNavTask(env, discrete_action = True, depth_signal = False, segment_input = False, hardness=self.hardness, reward_type=None, enable_noise = self.enable_noise, **self.render_cache_kwargs)
         self._env = env
 
     def observation(self, observation):
@@ -430,11 +533,49 @@ class GymHouseEnv(gym.Env):
         if self._reset_scene_counter != -1:
             return
 
-        scene_id = random.randrange(len(self.scenes))
+        scene_id = self._next_scene_id
         self.scene = self.scenes[scene_id]
         self._inner_env.reset_house(scene_id)
         self._reset_scene_counter = self.reset_scene_trials
-        self._env.reset_hardness(self.hardness, force = True)
+        self._schedule_next_scene()
+        # The available coordinates are recomputed when the next episode sets its target
+
+    def _schedule_next_scene(self):
+        # The next house is picked ahead of time and prepared while the current episodes run
+        self._next_scene_id = random.choice(self._active_scene_ids)
+        if self.prefetch_scenes:
+            self._inner_env.prefetch_house(self._next_scene_id, self.room_types)
+
+    def _set_active_scenes(self, scenes):
+        active_scene_ids = sorted(self.scenes.index(x) for x in set(scenes))
+        if active_scene_ids == self._active_scene_ids:
+            return False
+
+        self._active_scene_ids = active_scene_ids
+        return True
+
+    def set_scene_assignment(self, assignment):
+        """Sets the scenes played by this worker from the assignment of all workers"""
+        if not self.is_multi or not self._set_active_scenes(assignment[self.worker_index]):
+            return
+
+        if self._env is not None:
+            self._schedule_next_scene()
+            if self.scenes.index(self.scene) not in self._active_scene_ids:
+                # Switch at the next reset
+                self._reset_scene_counter = 0
+
+    def get_scene_stats(self):
+        """Returns the steps, the mean step time and the memory of the scenes played by this worker"""
+        return { scene: dict(x) for scene, x in self._scene_stats.items() }
+
+    def _update_scene_stats(self, step_time):
+        stats = self._scene_stats.get(self.scene)
+        if stats is None:
+            stats = self._scene_stats[self.scene] = dict(steps = 0, step_time = step_time, nbytes = 0)
+        stats['steps'] += 1
+        stats['step_time'] += (step_time - stats['step_time']) * max(0.01, 1.0 / stats['steps'])
+        stats['nbytes'] = getattr(self._env.house, '_nbytes', 0)
 
     @property
     def all_desired_rooms(self):
@@ -448,10 +589,13 @@ class GymHouseEnv(gym.Env):
         if self.room_types is not None:
             goals.intersection_update(set(self.room_types))
 
-        target = random.choice(list(goals))
+        target = self._sample_target(goals)
 
         return self.observation(self._reset_with_target(target, None))
 
+    def _sample_target(self, goals):
+        return random.choice(list(goals))
+
     @property
     def state(self):
         if self._env is None:
@@ -471,28 +615,74 @@ class GymHouseEnv(gym.Env):
 
     def step(self, action):
         self._ensure_env_ready()
+        ts = time.time()
         obs, reward, done, info = self._env.step(action)
-        return self.observation(obs), reward, done, info
-
+        obs = self.observation(obs)
+        if self.is_multi:
+            self._update_scene_stats(time.time() - ts)
+        image_cache = getattr(self, 'image_cache', None)
+        if done and image_cache is not None:
+            # Reported once per episode
+            info['goal_cache'] = image_cache.cache_stats
+        return obs, reward, done, info
 
-class GoalGymHouseEnv(GymHouseEnv):
-    def __init__(self, goals = None, **kwargs):
-        super().__init__(goals = goals, **kwargs)
 
-        self.goal_image_file = None
-        self.observation_space = gym.spaces.Tuple((
-            self.observation_space,
-            gym.spaces.Box(0, 255, self.screen_size + (3,), dtype = np.uint8)))
+class GoalGymHouseEnvBase(GymHouseEnv):
+    """Base of the environments with a goal image of the target room
 
+    The goal of the next episode is sampled and decoded by the goal prefetcher
+    while the current episode runs. Subclasses fetch the goal in `_fetch_goal`
+    and store it in `_set_goal`.
+    """
     def _initialize(self):
         super()._initialize()
-        self.image_cache = GoalImageCache(self.screen_size, os.path.join(self.configuration['prefix'], '..'))
+        self.image_cache = GoalImageCache(self.screen_size, os.path.join(self.configuration['prefix'], '..'), **self.goal_cache_kwargs)
 
     def seed(self, seed = None):
         self._ensure_env_ready()
+        self.goal_prefetcher.clear()
         self.image_cache.seed(seed)
         self._env.seed(seed)
 
+    @property
+    def all_desired_rooms(self):
+        scene = self.scene
+        return set(super().all_desired_rooms).intersection(self.goal_prefetcher.call(lambda: self.image_cache.all_goals(scene)))
+
+    def _fetch_goal(self, scene, target):
+        """Returns the goal and the path of the goal image"""
+        raise NotImplementedError()
+
+    def _set_goal(self, goal):
+        raise NotImplementedError()
+
+    def _sample_target(self, goals):
+        scene, goals = self.scene, sorted(goals)
+        def sample():
+            target = self.image_cache.random.choice(goals)
+            return target, self._fetch_goal(scene, target)
+
+        target, self._sampled_goal = self.goal_prefetcher.take((scene, tuple(goals)), sample)
+        return target
+
+    def _reset_with_target(self, target, state):
+        goal, self._sampled_goal = getattr(self, '_sampled_goal', None), None
+        if goal is None:
+            scene = self.scene
+            goal = self.goal_prefetcher.call(lambda: self._fetch_goal(scene, target))
+        self._set_goal(goal)
+        return super()._reset_with_target(target, state)
+
+
+class GoalGymHouseEnv(GoalGymHouseEnvBase):
+    def __init__(self, goals = None, **kwargs):
+        super().__init__(goals = goals, **kwargs)
+
+        self.goal_image_file = None
+        self.observation_space = gym.spaces.Tuple((
+            self.observation_space,
+            gym.spaces.Box(0, 255, self.screen_size + (3,), dtype = np.uint8)))
+
     def observation(self, observation):
         return (observation, self.goal_image)
 
@@ -510,13 +700,11 @@ class GoalGymHouseEnv(GymHouseEnv):
     def set_next_task(self, task):
         self._next_task = task
 
-    @property
-    def all_desired_rooms(self):
-        return set(super().all_desired_rooms).intersection(self.image_cache.all_goals(self.scene))
+    def _fetch_goal(self, scene, target):
+        return self.image_cache.fetch_random(scene, target)
 
-    def _reset_with_target(self, target, state):
-        self.goal_image, self.goal_image_file = self.image_cache.fetch_random(self.scene, target)
-        return super()._reset_with_target(target, state)
+    def _set_goal(self, goal):
+        self.goal_image, self.goal_image_file = goal
 
     @property
     def state(self):
@@ -524,30 +712,26 @@ class GoalGymHouseEnv(GymHouseEnv):
         return GoalGymHouseState(target_image = self.goal_image_file, **state._asdict())
 
 
-class GoalGymHouseAuxiliaryEnv(GymHouseEnv):
-    def __init__(self, goals = None, **kwargs):
+class GoalGymHouseAuxiliaryEnv(AuxiliaryTargetMixin, GoalGymHouseEnvBase):
+    def __init__(self, goals = None, auxiliary_target_size = None, auxiliary_cell_size = 4, **kwargs):
         super().__init__(goals = goals, **kwargs)
 
+        self._set_auxiliary_target(auxiliary_target_size, auxiliary_cell_size)
+        target_size = self.auxiliary_target_shape
         self.observation_space = gym.spaces.Tuple((
             self.observation_space,
             gym.spaces.Box(0, 255, self.screen_size + (3,), dtype = np.uint8),
-            gym.spaces.Box(0, 255, self.screen_size + (1,), dtype = np.uint8),
-            gym.spaces.Box(0, 255, self.screen_size + (3,), dtype = np.uint8),
-            gym.spaces.Box(0, 255, self.screen_size + (3,), dtype = np.uint8)))
-
-    def _initialize(self):
-        super()._initialize()
-        self.image_cache = GoalImageCache(self.screen_size, os.path.join(self.configuration['prefix'], '..'))
+            gym.spaces.Box(0, 255, target_size + (1,), dtype = np.uint8),
+            gym.spaces.Box(0, 255, target_size + (3,), dtype = np.uint8),
+            gym.spaces.Box(0, 255, target_size + (3,), dtype = np.uint8)))
 
     def observation(self, observation):
-        depth = self._env.env.render(mode='depth')[...,:1]
-        mask = self._env.env.render(mode = 'semantic')        
-        return (observation, self.goal_target[0], depth, mask, self.goal_target[1])
+        depth, mask = self._env.render_frames(('depth', 'semantic'))
+        return (observation, self.goal_target[0], self._auxiliary_target(depth), self._auxiliary_target(mask), self.goal_target[1])
 
-    @property
-    def all_desired_rooms(self):
-        return set(super().all_desired_rooms).intersection(self.image_cache.all_goals(self.scene))
+    def _fetch_goal(self, scene, target):
+        (goal_image, goal_mask), goal_image_file = self.image_cache.fetch_random_with_semantic(scene, target)
+        return (goal_image, self._auxiliary_target(goal_mask)), goal_image_file
 
-    def _reset_with_target(self, target, state):
-        self.goal_target, self.goal_image_file = self.image_cache.fetch_random_with_semantic(self.scene, target)
-        return super()._reset_with_target(target, state)
\ No newline at end of file
+    def _set_goal(self, goal):
+        self.goal_target, self.goal_image_file = goal
@@ -0,0 +1,193 @@
+import os
+import time
+import pickle
+import multiprocessing
+import numpy as np
+from House3D.core import local_create_house
+
+# Bump when the layout of the prepared houses changes
+HOUSE_CACHE_VERSION = 1
+CONNMAP_CACHE_VERSION = 1
+
+
+def house_cache_path(house_id, config, variant = 'default'):
+    return os.path.join(config['prefix'], house_id, 'prepared-%s-v%s.pkl' % (variant, HOUSE_CACHE_VERSION))
+
+
+def _dump_atomic(obj, path):
+    tmp_path = '%s.%s.tmp' % (path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(obj, f, protocol = pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def load_house(house_id, config, create = local_create_house, variant = 'default'):
+    """Loads a prepared house from the cache
+
+    On a cache miss the house is built with `create(house_id, config)` (the parsed
+    house together with its movable map and connectivity data) and persisted
+    under the dataset prefix, so that all other workers and runs only unpickle it.
+    """
+    path = house_cache_path(house_id, config, variant)
+    house = None
+    if os.path.isfile(path):
+        try:
+            with open(path, 'rb') as f:
+                house = pickle.load(f)
+        except Exception as e:
+            print('WARNING: Cannot load cached house %s (%s), rebuilding' % (path, e))
+
+    if house is None:
+        house = create(house_id, config)
+        try:
+            _dump_atomic(house, path)
+        except OSError as e:
+            print('WARNING: Cannot store cached house %s (%s)' % (path, e))
+
+    house._house_id = house_id
+    return house
+
+
+def _prepare_house(args):
+    house_id, config = args
+    load_house(house_id, config)
+    return house_id
+
+
+def prepare_houses(house_ids, config, processes = None):
+    """Builds missing house cache entries in a process pool"""
+    missing = [x for x in house_ids if not os.path.isfile(house_cache_path(x, config))]
+    if len(missing) == 0:
+        return
+
+    print('Preparing %s houses ...' % len(missing))
+    ts = time.time()
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    processes = min(processes, len(missing))
+
+    # Daemonic processes (e.g. vec env workers) are not allowed to have children
+    if processes <= 1 or multiprocessing.current_process().daemon:
+        for house_id in missing:
+            _prepare_house((house_id, config))
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            pool.map(_prepare_house, [(x, config) for x in missing])
+    print('  >> Done! Time Elapsed = %.4f(s)' % (time.time() - ts))
+
+
+def load_houses(houses, config, processes = None):
+    """Returns House instances for a list of house ids or House instances"""
+    prepare_houses([x for x in houses if isinstance(x, str)], config, processes)
+    return [load_house(x, config) if isinstance(x, str) else x for x in houses]
+
+
+def connmap_cache_path(house_id, config, target):
+    return os.path.join(config['prefix'], house_id, 'connmap-v%s-%s.npz' % (CONNMAP_CACHE_VERSION, target))
+
+
+def _compact(array, dtype):
+    array = np.asarray(array)
+    info = np.iinfo(dtype)
+    if array.size == 0 or (array.min() >= info.min and array.max() <= info.max):
+        return array.astype(dtype)
+    return array
+
+
+def store_connmap(house, house_id, config):
+    """Stores the connectivity data of the current target room of the house
+
+    The distance maps are stored as int16 whenever they fit and compressed, the
+    original dtypes are restored by `load_connmap`.
+    """
+    path = connmap_cache_path(house_id, config, house.targetRoomTp)
+    tmp_path = '%s.%s.tmp.npz' % (path[:-len('.npz')], os.getpid())
+    connMap = np.asarray(house.connMap)
+    np.savez_compressed(tmp_path,
+        connMap = _compact(connMap, np.int16),
+        connMapDtype = np.array(connMap.dtype.str),
+        connectedCoors = _compact(np.array(house.connectedCoors).reshape(-1, 2), np.int16),
+        inroomDist = np.asarray(house.inroomDist),
+        maxConnDist = np.array(house.maxConnDist))
+    os.replace(tmp_path, path)
+
+
+def load_connmap(house, house_id, config, target):
+    """Puts the stored connectivity data of the target into house.connMapDict
+
+    Returns:
+        True if the data were found in the cache
+    """
+    if target in house.connMapDict:
+        return True
+
+    path = connmap_cache_path(house_id, config, target)
+    if not os.path.isfile(path):
+        return False
+
+    try:
+        with np.load(path) as data:
+            connMap = data['connMap'].astype(np.dtype(str(data['connMapDtype'])))
+            connectedCoors = [tuple(x) for x in data['connectedCoors'].astype(np.int64).tolist()]
+            house.connMapDict[target] = (connMap, connectedCoors, data['inroomDist'], data['maxConnDist'].item())
+    except Exception as e:
+        print('WARNING: Cannot load cached connectivity map %s (%s), rebuilding' % (path, e))
+        return False
+    return True
+
+
+def set_target_room(house, target, config):
+    """Same as house.setTargetRoom, but uses the connectivity map cache
+
+    Missing connectivity maps are computed by House3D and persisted, houses
+    which did not come from the house cache are not cached.
+    """
+    house_id = getattr(house, '_house_id', None)
+    if house_id is None or target == house.targetRoomTp:
+        return house.setTargetRoom(target)
+
+    if load_connmap(house, house_id, config, target):
+        return house.setTargetRoom(target)
+
+    changed = house.setTargetRoom(target)
+    try:
+        store_connmap(house, house_id, config)
+    except OSError as e:
+        print('WARNING: Cannot store cached connectivity map for %s (%s)' % (house_id, e))
+    return changed
+
+
+def cache_connmaps(house, config, targets = None):
+    """Makes the connectivity maps of all targets available in the house"""
+    if targets is None:
+        targets = house.all_desired_roomTypes
+    for target in targets:
+        if target in house.all_desired_roomTypes:
+            set_target_room(house, target, config)
+
+
+def _prepare_connmaps(args):
+    house_id, config = args
+    house = load_house(house_id, config)
+    cache_connmaps(house, config)
+    return house_id
+
+
+def prepare_connmaps(house_ids, config, processes = None):
+    """Computes the connectivity maps of all desired room types of the houses in a process pool"""
+    prepare_houses(house_ids, config, processes)
+
+    print('Preparing connectivity maps of %s houses ...' % len(house_ids))
+    ts = time.time()
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    processes = min(processes, len(house_ids))
+
+    if processes <= 1 or multiprocessing.current_process().daemon:
+        for house_id in house_ids:
+            _prepare_connmaps((house_id, config))
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            for _ in pool.imap_unordered(_prepare_connmaps, [(x, config) for x in house_ids]):
+                pass
+    print('  >> Done! Time Elapsed = %.4f(s)' % (time.time() - ts))
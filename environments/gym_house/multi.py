@@ -1,42 +1,147 @@
 from deep_rl.common.env import SubprocVecEnv, DummyVecEnv
-from House3D.core import Environment, local_create_house
+from House3D.core import Environment
+from .house_cache import load_houses, prepare_houses, cache_connmaps
+from .env import create_configuration
+from .scheduler import SceneBalancer
+from ..util import LRUCache, estimate_nbytes
+from concurrent.futures import ThreadPoolExecutor
 import random
 import time
 import gym
 
-def create_multiscene(num_processes, scenes, wrap = lambda e: e, **kwargs):
-    assert len(scenes) % num_processes == 0, "The number of processes %s must devide the number of scenes %s" % (num_processes, len(scenes))
-    scenes_per_process = len(scenes) // num_processes
+def create_multiscene(num_processes, scenes, wrap = lambda e: e, balance_scenes = False, rebalance_period = 600, **kwargs):
+    """Creates a vec env whose workers share the scenes
+
+    With balance_scenes, every worker can load any of the scenes lazily and only
+    plays the ones assigned to it. The assignment is updated by calling
+    `env.rebalance_scenes()` (at most once per rebalance_period seconds) based on
+    the per-scene statistics measured in the workers.
+    """
+    # Build the house cache once here, the workers only load it
+    prepare_houses(scenes, create_configuration(kwargs.get('configuration')))
+
+    balancer = SceneBalancer(scenes, num_processes, period = rebalance_period)
+    balance_scenes = balance_scenes and balancer.can_rebalance
 
     funcs = []
-    for i in range(num_processes):
-        funcs.append(lambda: wrap(gym.make(**kwargs, scene = scenes[i * scenes_per_process:(i + 1) * scenes_per_process])))
+    for i, worker_scenes in enumerate(balancer.assignment):
+        if balance_scenes:
+            worker_kwargs = dict(scene = list(scenes), active_scenes = worker_scenes, worker_index = i, lazy_houses = True)
+            worker_kwargs.setdefault('max_resident_houses', len(worker_scenes) + 1)
+            worker_kwargs.update(kwargs)
+        else:
+            worker_kwargs = dict(kwargs, scene = worker_scenes)
+
+        # Bind the arguments now, the closure would see only the last worker's ones
+        funcs.append(lambda worker_kwargs = worker_kwargs: wrap(gym.make(**worker_kwargs)))
 
     if num_processes == 1:
-        return DummyVecEnv(funcs)
+        env = DummyVecEnv(funcs)
 
     else:
-        return SubprocVecEnv(funcs)
+        env = SubprocVecEnv(funcs)
+
+    def rebalance_scenes(force = False):
+        if not balance_scenes or not balancer.is_due(force):
+            return False
+
+        # The statistics are only collected from the workers when the period has passed
+        balancer.update(env.call_unwrapped('get_scene_stats'))
+        assignment = balancer.rebalance(force = force)
+        if assignment is None:
+            return False
+
+        env.call_unwrapped('set_scene_assignment', assignment)
+        return True
+
+    env.scene_balancer = balancer
+    env.rebalance_scenes = rebalance_scenes
+    return env
 
 
 class MultiHouseEnv(Environment):
-    def __init__(self, api, houses, config, seed=None):
+    def __init__(self, api, houses, config, seed=None, lazy=False, max_resident_houses=None, max_resident_bytes=None, initial_house=0):
         """
         Args:
             houses: a list of house id or `House` instance.
+            lazy (bool, optional): when true, houses are loaded on first selection and only
+                                   a bounded set of them is kept resident (LRU eviction)
+            max_resident_houses (int, optional): maximum number of resident houses in the lazy mode
+            max_resident_bytes (int, optional): maximum memory held by resident houses in the lazy mode
+            initial_house (int, optional): the house used before the first `reset_house` call
         """
-        print('Generating all houses ...')
-        ts = time.time()
         if not isinstance(houses, list):
             houses = [houses]
-        _args = [(h, config) for h in houses]
-        self.all_houses = list(map(lambda x: local_create_house(*x), _args))
-        print('  >> Done! Time Elapsed = %.4f(s)' % (time.time() - ts))
-        for i, h in enumerate(self.all_houses):
-            h._id = i
-            h._cachedLocMap = None
+        self._houses = houses
+        self._config = config
+        self.house_stats = dict(loads = 0, evictions = 0, load_time = 0.0)
+        self.last_switch_time = 0.0
+        self._prefetch_executor = None
+        self._prefetched = None
+        if lazy:
+            assert all(isinstance(x, str) for x in houses), 'Lazy mode requires house ids'
+            self._resident_houses = LRUCache(max_items = max_resident_houses, max_bytes = max_resident_bytes)
+            self.all_houses = None
+            first_house = self._get_house(initial_house)
+        else:
+            print('Generating all houses ...')
+            ts = time.time()
+            self._resident_houses = None
+            self.all_houses = load_houses(houses, config)
+            print('  >> Done! Time Elapsed = %.4f(s)' % (time.time() - ts))
+            for i, h in enumerate(self.all_houses):
+                h._id = i
+                h._cachedLocMap = None
+            first_house = self.all_houses[initial_house]
+
         super(MultiHouseEnv, self).__init__(
-            api, house=self.all_houses[0], config=config, seed=seed)
+            api, house=first_house, config=config, seed=seed)
+
+    @property
+    def is_lazy(self):
+        return self._resident_houses is not None
+
+    def _get_house(self, house_id):
+        if not self.is_lazy:
+            return self.all_houses[house_id]
+
+        house = self._resident_houses.get(house_id)
+        if house is None:
+            ts = time.time()
+            house = load_houses([self._houses[house_id]], self._config)[0]
+            house._id = house_id
+            house._cachedLocMap = None
+            house._nbytes = estimate_nbytes(house)
+            # The house of the running episodes stays resident when a house is prefetched
+            current = getattr(self, 'house', None)
+            self._resident_houses.put(house_id, house, size = house._nbytes, keep = (current._id,) if current is not None else ())
+            self.house_stats['loads'] += 1
+            self.house_stats['load_time'] += time.time() - ts
+            self.house_stats['evictions'] = self._resident_houses.stats['evictions']
+        return house
+
+    def _prepare_house(self, house_id, targets):
+        house = self._get_house(house_id)
+        # Loads or computes the connectivity maps of the targets into house.connMapDict
+        cache_connmaps(house, self._config, targets)
+        return house
+
+    def prefetch_house(self, house_id, targets=None):
+        """
+        Prepares the CPU side data of a house on a background thread, so that
+        a later `reset_house(house_id)` only swaps the objects in the renderer.
+        Args:
+            house_id (int): a integer in range(0, self.num_house).
+            targets (list, optional): room types whose connectivity maps are precomputed.
+                If None, all desired room types of the house are used.
+        """
+        if house_id == self.house._id:
+            # The current house is being used by the running episodes
+            return
+
+        if self._prefetch_executor is None:
+            self._prefetch_executor = ThreadPoolExecutor(max_workers = 1)
+        self._prefetched = (house_id, self._prefetch_executor.submit(self._prepare_house, house_id, targets))
 
     def reset_house(self, house_id=None):
         """
@@ -46,25 +151,39 @@ class MultiHouseEnv(Environment):
                 If None, will choose a random one.
         """
         if house_id is None:
-            self.house = random.choice(self.all_houses)
+            house_id = random.randrange(self.num_house)
+
+        ts = time.time()
+        prefetched, self._prefetched = self._prefetched, None
+        if prefetched is not None and prefetched[0] == house_id:
+            self.house = prefetched[1].result()
         else:
-            self.house = self.all_houses[house_id]
+            if prefetched is not None:
+                # Do not mutate a house concurrently with the background thread
+                prefetched[1].result()
+            self.house = self._get_house(house_id)
         self._load_objects()
+        self.last_switch_time = time.time() - ts
 
     def cache_shortest_distance(self):
-        # TODO
-        for house in self.all_houses:
-            house.cache_all_target()
+        for house in (self._resident_houses.values() if self.is_lazy else self.all_houses):
+            if house is not self.house:
+                cache_connmaps(house, self._config)
 
     @property
     def info(self):
         ret = super(MultiHouseEnv, self).info
         ret['house_id'] = self.house._id
+        ret['scene_switch_time'] = self.last_switch_time
+        if self.is_lazy:
+            ret['house_loads'] = self.house_stats['loads']
+            ret['house_evictions'] = self.house_stats['evictions']
+            ret['house_load_time'] = self.house_stats['load_time']
         return ret
 
     @property
     def num_house(self):
-        return len(self.all_houses)
+        return len(self._houses)
 
     def gen_2dmap(self, x=None, y=None, resolution=None):
         # TODO move cachedLocMap to House
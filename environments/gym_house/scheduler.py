@@ -0,0 +1,119 @@
+import time
+import numpy as np
+
+
+def partition_scenes(scenes, num_workers):
+    """Splits scenes into num_workers non-empty groups of (almost) equal size
+
+    If there are fewer scenes than workers, the scenes are shared round-robin.
+    """
+    if len(scenes) < num_workers:
+        return [[scenes[i % len(scenes)]] for i in range(num_workers)]
+    return [list(x) for x in np.array_split(np.array(scenes, dtype = object), num_workers)]
+
+
+class SceneBalancer:
+    """Assigns scenes to vec env workers based on the measured per-scene cost
+
+    The cost of a scene is its mean step time plus `memory_weight` times its memory,
+    both relative to the mean over all measured scenes. All workers step in lockstep
+    and every worker cycles through its scenes, so the load of a worker is the mean
+    cost of its scenes. The scenes are spread with the longest processing time first
+    heuristic keeping the number of scenes per worker fixed. Scenes stay with their
+    current worker unless it is more than `stickiness` worse than the best one, and a new assignment
+    is only used if it reduces the most loaded worker by at least `min_improvement`,
+    because moving a scene means loading the house in another worker.
+    """
+    def __init__(self, scenes, num_workers, period = 600, memory_weight = 0.25, stickiness = 0.1, min_improvement = 0.05):
+        self.scenes = list(scenes)
+        self.num_workers = num_workers
+        self.period = period
+        self.memory_weight = memory_weight
+        self.stickiness = stickiness
+        self.min_improvement = min_improvement
+        self.assignment = partition_scenes(self.scenes, num_workers)
+        self.stats = dict()
+        self._last_rebalance = time.time()
+
+    @property
+    def can_rebalance(self):
+        return len(self.scenes) > self.num_workers
+
+    def update(self, worker_stats):
+        """Merges per-scene statistics reported by the workers
+
+        Args:
+            worker_stats: list of dicts mapping scene to dict(steps, step_time, nbytes)
+        """
+        for stats in worker_stats:
+            for scene, value in (stats or dict()).items():
+                if scene not in self.stats or value['steps'] >= self.stats[scene]['steps']:
+                    self.stats[scene] = dict(value)
+
+    def scene_costs(self):
+        measured = [x for x in self.stats.values() if x['steps'] > 0]
+        mean_time = np.mean([x['step_time'] for x in measured]) if measured else 1.0
+        mean_bytes = np.mean([x['nbytes'] for x in measured]) if measured else 0.0
+
+        costs = dict()
+        for scene in self.scenes:
+            stats = self.stats.get(scene)
+            if stats is None or stats['steps'] == 0:
+                # Not measured yet, assume an average scene
+                costs[scene] = 1.0 + (self.memory_weight if mean_bytes > 0 else 0.0)
+                continue
+
+            cost = stats['step_time'] / mean_time if mean_time > 0 else 1.0
+            if mean_bytes > 0:
+                cost += self.memory_weight * stats['nbytes'] / mean_bytes
+            costs[scene] = cost
+        return costs
+
+    def _loads(self, assignment, costs):
+        return [sum(costs[x] for x in scenes) / len(scenes) for scenes in assignment]
+
+    def compute_assignment(self):
+        costs = self.scene_costs()
+        owner = { scene: i for i, scenes in enumerate(self.assignment) for scene in scenes }
+        capacity = [len(x) for x in partition_scenes(self.scenes, self.num_workers)]
+        loads = [0.0] * self.num_workers
+        assignment = [[] for _ in range(self.num_workers)]
+        remaining = sum(costs.values())
+
+        # Estimated final load of the worker, its free slots are filled with scenes of the mean remaining cost
+        def projected(i, scene):
+            free = capacity[i] - len(assignment[i]) - 1
+            return (loads[i] + costs[scene] + free * fill_cost) / capacity[i]
+
+        unplaced = len(self.scenes)
+        for scene in sorted(self.scenes, key = lambda x: costs[x], reverse = True):
+            remaining -= costs[scene]
+            unplaced -= 1
+            fill_cost = remaining / unplaced if unplaced > 0 else 0.0
+            candidates = [i for i in range(self.num_workers) if len(assignment[i]) < capacity[i]]
+            best = min(candidates, key = lambda i: projected(i, scene))
+            current = owner.get(scene)
+            if current in candidates and projected(current, scene) <= projected(best, scene) * (1.0 + self.stickiness):
+                best = current
+
+            assignment[best].append(scene)
+            loads[best] += costs[scene]
+        return assignment
+
+    def is_due(self, force = False):
+        """Whether `rebalance` would compute a new assignment, checked before collecting the statistics"""
+        return self.can_rebalance and (force or time.time() - self._last_rebalance >= self.period)
+
+    def rebalance(self, force = False):
+        """Returns a new assignment or None if the current one should be kept"""
+        if not self.is_due(force):
+            return None
+
+        self._last_rebalance = time.time()
+        costs = self.scene_costs()
+        assignment = self.compute_assignment()
+        if max(self._loads(assignment, costs)) > max(self._loads(self.assignment, costs)) * (1.0 - self.min_improvement):
+            return None
+
+        self.assignment = assignment
+        return assignment
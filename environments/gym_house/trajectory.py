@@ -0,0 +1,122 @@
+import gym
+import struct
+from collections import namedtuple
+from .cenv import GymHouseState, GoalGymHouseState
+
+# File layout: MAGIC, then a sequence of records. An episode record is
+# b'E' + house id, target room and goal image (length prefixed utf-8 strings)
+# + the initial pose, every step appends b'S' + pose, action and reward.
+MAGIC = b'HTRJ\x01'
+_pose = struct.Struct('<fff')
+_step = struct.Struct('<fffif')
+_length = struct.Struct('<H')
+
+Trajectory = namedtuple('Trajectory', ['house_id', 'target_room', 'target_image', 'states', 'actions', 'rewards'])
+
+
+def _write_string(f, value):
+    value = (value or '').encode('utf-8')
+    f.write(_length.pack(len(value)))
+    f.write(value)
+
+
+def _read_string(f):
+    length, = _length.unpack(_read_exactly(f, _length.size))
+    return _read_exactly(f, length).decode('utf-8') or None
+
+
+def _read_exactly(f, size):
+    data = f.read(size)
+    if len(data) != size:
+        raise EOFError()
+    return data
+
+
+class TrajectoryWriter:
+    """Appends episode trajectories to a trajectory log"""
+    def __init__(self, path):
+        self._file = open(path, 'ab')
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+
+    def start_episode(self, state, target_room = None):
+        self._file.write(b'E')
+        _write_string(self._file, state.house_id)
+        _write_string(self._file, target_room)
+        _write_string(self._file, getattr(state, 'target_image', None))
+        self._file.write(_pose.pack(state.x, state.y, state.rotation))
+
+    def add_step(self, state, action, reward):
+        self._file.write(b'S')
+        self._file.write(_step.pack(state.x, state.y, state.rotation, int(action), reward))
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def read_trajectories(path):
+    """Yields the logged trajectories, a truncated last record is skipped"""
+    with open(path, 'rb') as f:
+        assert f.read(len(MAGIC)) == MAGIC, 'File %s is not a trajectory log' % path
+        episode = None
+        while True:
+            try:
+                tag = f.read(1)
+                if tag == b'E':
+                    house_id, target_room, target_image = _read_string(f), _read_string(f), _read_string(f)
+                    x, y, rotation = _pose.unpack(_read_exactly(f, _pose.size))
+                elif tag == b'S':
+                    x, y, rotation, action, reward = _step.unpack(_read_exactly(f, _step.size))
+                elif tag == b'':
+                    break
+                else:
+                    raise ValueError('Corrupted trajectory log %s' % path)
+            except EOFError:
+                break
+
+            if tag == b'E':
+                if episode is not None:
+                    yield episode
+                episode = Trajectory(house_id, target_room, target_image, [], [], [])
+            elif episode is None:
+                raise ValueError('Corrupted trajectory log %s' % path)
+            else:
+                episode.actions.append(action)
+                episode.rewards.append(reward)
+
+            if episode.target_image is not None:
+                episode.states.append(GoalGymHouseState(house_id, episode.target_image, x, y, rotation))
+            else:
+                episode.states.append(GymHouseState(house_id, x, y, rotation))
+
+        if episode is not None:
+            yield episode
+
+
+class TrajectoryLogWrapper(gym.Wrapper):
+    """Logs states, actions and rewards of all episodes
+
+    The log can be rendered to videos offline by render-trajectories.py.
+    """
+    def __init__(self, env, path):
+        super().__init__(env)
+        self.writer = TrajectoryWriter(path)
+
+    def reset(self):
+        observation = self.env.reset()
+        self.writer.start_episode(self.unwrapped.state, self.unwrapped.info.get('target_room'))
+        return observation
+
+    def step(self, action):
+        obs, reward, done, stats = self.env.step(action)
+        self.writer.add_step(self.unwrapped.state, action, reward)
+        if done:
+            self.writer.flush()
+        return obs, reward, done, stats
+
+    def close(self):
+        self.writer.close()
+        return self.env.close()
@@ -10,25 +10,74 @@ from cv2 import VideoWriter, VideoWriter_fourcc
 import numpy as np
 import cv2
 import os
+import queue
+import threading
+from itertools import count
+
+
+def render_states_video(renderer, states, output_path, size, action_frames = 10):
+    """Renders a video of the states next to the goal image
+
+    Args:
+        renderer: House3D Environment of the house of the states
+        states: a list of GoalGymHouseState
+        size: (height, width) of the rendered frames
+    """
+    height, width = size
+    writer = VideoWriter(output_path, VideoWriter_fourcc(*"XVID"), 30.0, (2 * width, height))
+    if getattr(states[0], 'target_image', None) is not None:
+        goal_image = cv2.imread('%s-render_rgb.png' % states[0].target_image)
+        goal_image = cv2.resize(goal_image, size, interpolation = cv2.INTER_CUBIC)
+    else:
+        goal_image = np.zeros((height, width, 3), dtype = np.uint8)
+
+    def render_single(position):
+        renderer.reset(*position)
+        frame = renderer.render()
+        frame = np.concatenate([frame, goal_image], axis = 1)
+        writer.write(frame)
+
+    state = states[0]
+    position = state.x, state.y, state.rotation
+    for state in states[1:]:
+        old_position = position
+        position = state.x, state.y, state.rotation
+
+        for j in range(action_frames):
+            interpolated = tuple(map(lambda a, b: a + (b - a) * j / action_frames, old_position, position))
+            render_single(interpolated)
+
+    for _ in range(action_frames):
+        render_single(position)
+
+    render_single(position)
+    writer.release()
 
 
 class RenderVideoWrapper(gym.Wrapper):
-    def __init__(self, env, path, action_frames = 10, width = 500, height = 500, renderer_config = None):
+    """Records videos of the episodes rendered from a third person view
+
+    Only the states are captured during the episode, rendering and encoding
+    runs on a background thread. At most max_pending_videos episodes wait
+    in the queue, after that the environment blocks until one is written.
+    Call close() to write all pending videos.
+    """
+    def __init__(self, env, path, action_frames = 10, width = 500, height = 500, renderer_config = None, max_pending_videos = 4):
         super().__init__(env)
         self.path = path
         self.action_frames = action_frames
         self.size = (height, width)
-        self.api = RenderAPI(w = width, h = height, device = 0)
         self.renderer_config = create_configuration(renderer_config)
         self.ep_states = []
+        self._api = None
         self._renderer_cache = (None, None)
-        pass
+        self._video_ids = count(len(os.listdir(self.path)) + 1)
+        self._queue = queue.Queue(maxsize = max_pending_videos)
+        self._worker = threading.Thread(target = self._process_videos, daemon = True)
+        self._worker.start()
 
     def reset(self):
-        if len(self.ep_states) > 0:
-            self.render_video(self.ep_states)
-            self.ep_states = []
-
+        self._finish_episode()
         observation = self.env.reset()
         self.ep_states = [self.unwrapped.state]
         return observation
@@ -37,51 +86,46 @@ class RenderVideoWrapper(gym.Wrapper):
         obs, reward, done, stats = self.env.step(action)
         self.ep_states.append(self.unwrapped.state)
         if done:
-            self.render_video(self.ep_states)
-            self.ep_states = []
+            self._finish_episode()
 
         return obs, reward, done, stats
 
-    def render_video(self, states):
-        house_id = states[0].house_id
-        if self._renderer_cache[0] == house_id:
-            renderer = self._renderer_cache[1]
-
-        renderer = Environment(self.api, house_id, self.renderer_config)
-        renderer.reset()
-        video_id = len(os.listdir(self.path)) + 1
-        output_filename = "vid-%s.avi" % video_id
-
-        height, width = self.size
-        writer = VideoWriter(os.path.join(self.path, output_filename), VideoWriter_fourcc(*"XVID"), 30.0, (2 * width, height))
-        goal_image = '%s-render_rgb.png' % states[0].target_image
-        goal_image = cv2.imread(goal_image)
-        goal_image = cv2.resize(goal_image, self.size, interpolation = cv2.INTER_CUBIC)
-
-        def render_single(position):
-            renderer.reset(*position)
-            frame = renderer.render()
-            frame = np.concatenate([frame, goal_image], axis = 1)
-            writer.write(frame)
+    def close(self):
+        self._finish_episode()
+        if self._worker.is_alive():
+            self._queue.put(None)
+            self._worker.join()
+        return self.env.close()
 
-        state = states[0]
-        position = position = state.x, state.y, state.rotation
-        for state in states[1:]:
-            old_position = position           
-            position = position = state.x, state.y, state.rotation
-
-            for j in range(self.action_frames):
-                interpolated = tuple(map(lambda a, b: a + (b - a) * j / self.action_frames, old_position, position))
-                render_single(interpolated)
-
-        for _ in range(self.action_frames):
-            render_single(position)
-
-        render_single(position)        
-        writer.release()
-
-        self._renderer_cache = (house_id, renderer)
+    def _finish_episode(self):
+        if len(self.ep_states) > 0:
+            self._queue.put((next(self._video_ids), self.ep_states))
+            self.ep_states = []
 
-        
+    def _process_videos(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            video_id, states = item
+            try:
+                self.render_video(states, video_id)
+            except Exception as e:
+                print('ERROR: Cannot record video %s (%s)' % (video_id, e))
+
+    def _get_renderer(self, house_id):
+        if self._renderer_cache[0] != house_id:
+            if self._api is None:
+                height, width = self.size
+                self._api = RenderAPI(w = width, h = height, device = 0)
+            renderer = Environment(self._api, house_id, self.renderer_config)
+            self._renderer_cache = (house_id, renderer)
+
+        renderer = self._renderer_cache[1]
+        renderer.reset()
+        return renderer
 
-    
\ No newline at end of file
+    def render_video(self, states, video_id):
+        renderer = self._get_renderer(states[0].house_id)
+        render_states_video(renderer, states, os.path.join(self.path, "vid-%s.avi" % video_id), self.size, self.action_frames)
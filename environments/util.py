@@ -0,0 +1,304 @@
+import os
+import sys
+import hashlib
+import shutil
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import cv2
+from download import file_lock
+
+
+def pool_auxiliary_target(image, output_size, cell_size = 4):
+    """Area-downsamples an auxiliary target frame to the deconvolution output size
+
+    The frame is center-cropped to output_size * cell_size first, the same way
+    the trainer crops the full resolution frames before average pooling them.
+    """
+    height, width = output_size[0] * cell_size, output_size[1] * cell_size
+    assert image.shape[0] >= height and image.shape[1] >= width, 'Frame %s is smaller than the pooled area %s' % (image.shape[:2], (height, width))
+    top = (image.shape[0] - height) // 2
+    left = (image.shape[1] - width) // 2
+    image = image[top:top + height, left:left + width]
+    result = cv2.resize(image, (output_size[1], output_size[0]), interpolation = cv2.INTER_AREA)
+    if len(result.shape) == 2:
+        result = np.expand_dims(result, 2)
+    return result
+
+
+# Depth frames of THOR are in millimeters, the uint8 depth images cover [0, 5m]
+DEPTH_RANGE = 5000.0
+
+
+def depth_to_uint8(depth):
+    """Quantizes a THOR depth frame to uint8, truncating and saturating beyond DEPTH_RANGE
+
+    Used for the pre-rendered goal and scene images and for the online
+    observations, so both have the same levels.
+    """
+    return np.clip(depth * (255.0 / DEPTH_RANGE), 0, 255).astype(np.uint8)
+
+
+class AuxiliaryTargetMixin:
+    """Pools the depth and segmentation targets of auxiliary envs in the worker
+
+    When auxiliary_target_size is set, the targets are pooled by `pool_auxiliary_target`
+    to the size of the deconvolution outputs, so that the trainer receives them already
+    pooled. Otherwise the full resolution frames are returned.
+    """
+    def _set_auxiliary_target(self, auxiliary_target_size, auxiliary_cell_size):
+        self.auxiliary_target_size = auxiliary_target_size
+        self.auxiliary_cell_size = auxiliary_cell_size
+
+    @property
+    def auxiliary_target_shape(self):
+        return tuple(self.auxiliary_target_size) if self.auxiliary_target_size is not None else tuple(self.screen_size)
+
+    def _auxiliary_target(self, image):
+        if self.auxiliary_target_size is None:
+            return image
+        return pool_auxiliary_target(image, self.auxiliary_target_size, self.auxiliary_cell_size)
+
+
+def estimate_nbytes(obj, _seen = None):
+    """Estimates the memory held by numpy arrays inside of a (nested) object"""
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    elif isinstance(obj, (list, tuple, set)):
+        return sum(estimate_nbytes(x, _seen) for x in obj)
+    elif isinstance(obj, dict):
+        return sum(estimate_nbytes(x, _seen) for x in obj.values())
+    elif hasattr(obj, '__dict__'):
+        return estimate_nbytes(vars(obj), _seen)
+    return sys.getsizeof(obj)
+
+
+class LRUCache:
+    """Least recently used cache bounded by the number of items and/or their size in bytes
+
+    The most recently inserted item is never evicted, even if it alone exceeds the budget,
+    and neither are the keys passed as `keep` to `put`.
+    """
+    def __init__(self, max_items = None, max_bytes = None, sizeof = estimate_nbytes):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.nbytes = 0
+        self.stats = dict(hits = 0, misses = 0, evictions = 0)
+        self._items = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def keys(self):
+        with self._lock:
+            return list(self._items.keys())
+
+    def values(self):
+        with self._lock:
+            return [value for value, _ in self._items.values()]
+
+    def get(self, key, default = None):
+        with self._lock:
+            if key not in self._items:
+                self.stats['misses'] += 1
+                return default
+
+            self.stats['hits'] += 1
+            self._items.move_to_end(key)
+            return self._items[key][0]
+
+    def put(self, key, value, size = None, keep = ()):
+        with self._lock:
+            self.pop(key)
+            if size is None:
+                size = self.sizeof(value)
+            self._items[key] = (value, size)
+            self.nbytes += size
+            while self._is_over_budget():
+                evicted = next((x for x in self._items if x != key and x not in keep), None)
+                if evicted is None:
+                    break
+                self.pop(evicted)
+                self.stats['evictions'] += 1
+
+    def pop(self, key, default = None):
+        with self._lock:
+            if key not in self._items:
+                return default
+            value, size = self._items.pop(key)
+            self.nbytes -= size
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.nbytes = 0
+
+    def _is_over_budget(self):
+        if self.max_items is not None and len(self._items) > self.max_items:
+            return True
+        return self.max_bytes is not None and self.nbytes > self.max_bytes
+
+
+class SharedArrayStore:
+    """Numpy arrays shared by all processes on a host through files in /dev/shm
+
+    Arrays are stored once, written to a temporary file and renamed, and the
+    readers memory map them, so the pages are held only once in memory.
+    Nothing is stored after the files of the store hold max_bytes. The size of
+    the store is kept in a small file updated under a file lock, so the budget
+    is shared by all processes, and a full store is not checked again for
+    full_recheck_period seconds. The name should identify the stored content
+    (e.g. contain a hash of the dataset), the files outlive the processes until
+    `cleanup` is called.
+    """
+    full_recheck_period = 60.0
+
+    def __init__(self, name, max_bytes = 1024 * 1024 * 1024, root = '/dev/shm'):
+        self.path = os.path.join(root, name)
+        self.max_bytes = max_bytes
+        self.enabled = os.path.isdir(root)
+        self.nbytes = 0
+        self._full_since = None
+        if not self.enabled:
+            print('WARNING: Shared memory directory %s does not exist, sharing disabled' % root)
+            return
+
+        with self._lock():
+            self.nbytes = self._read_size()
+
+    def _file(self, key):
+        return os.path.join(self.path, '%s.npy' % hashlib.sha1(repr(key).encode('utf-8')).hexdigest())
+
+    def _lock(self):
+        return file_lock(self.path + '.lock')
+
+    def _size_file(self):
+        return os.path.join(self.path, 'size')
+
+    def _read_size(self):
+        # Called under the lock, the directory is scanned only if the size file is missing or broken
+        try:
+            with open(self._size_file(), 'r') as f:
+                return int(f.read())
+        except (FileNotFoundError, ValueError):
+            pass
+
+        os.makedirs(self.path, exist_ok = True)
+        nbytes = sum(x.stat().st_size for x in os.scandir(self.path) if x.name.endswith('.npy'))
+        self._write_size(nbytes)
+        return nbytes
+
+    def _write_size(self, nbytes):
+        with open(self._size_file(), 'w') as f:
+            f.write(str(nbytes))
+
+    def get(self, key, default = None):
+        if not self.enabled:
+            return default
+        try:
+            return np.load(self._file(key), mmap_mode = 'r')
+        except (FileNotFoundError, ValueError):
+            return default
+
+    def put(self, key, value):
+        if not self.enabled:
+            return False
+        if self._full_since is not None and time.time() - self._full_since < self.full_recheck_period:
+            return False
+
+        path = self._file(key)
+        if os.path.exists(path):
+            return True
+
+        tmp_path = '%s.%s.tmp' % (path, os.getpid())
+        with self._lock():
+            if os.path.exists(path):
+                return True
+
+            self.nbytes = self._read_size()
+            if self.nbytes + value.nbytes > self.max_bytes:
+                self._full_since = time.time()
+                return False
+
+            self._full_since = None
+            try:
+                with open(tmp_path, 'wb') as f:
+                    np.save(f, value)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print('WARNING: Cannot store a shared array (%s)' % e)
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                return False
+
+            self.nbytes += os.path.getsize(path)
+            self._write_size(self.nbytes)
+        return True
+
+    def cleanup(self):
+        """Removes all files of the store, arrays already mapped by readers stay valid"""
+        if not self.enabled:
+            return
+        with self._lock():
+            shutil.rmtree(self.path, ignore_errors = True)
+            self.nbytes = 0
+            self._full_since = None
+
+
+class GoalPrefetcher:
+    """Computes the goal of the next episode on a background thread
+
+    `take(key, fn)` returns fn() and immediately starts computing the next fn()
+    for the same key. If the next call asks for a different key, the prefetched
+    value is dropped. All calls run on a single worker thread in the order of
+    submission, so random draws inside fn stay deterministic for a given seed
+    and sequence of keys. With enabled = False everything runs synchronously.
+    """
+    def __init__(self, enabled = True):
+        self.enabled = enabled
+        self._executor = None
+        self._pending = None
+
+    def call(self, fn):
+        """Runs fn serialized with the prefetched computations"""
+        if not self.enabled:
+            return fn()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers = 1)
+        return self._executor.submit(fn).result()
+
+    def take(self, key, fn):
+        if not self.enabled:
+            return fn()
+
+        pending, self._pending = self._pending, None
+        if pending is not None and pending[0] == key:
+            result = pending[1].result()
+        else:
+            result = self.call(fn)
+        self._pending = (key, self._executor.submit(fn))
+        return result
+
+    def clear(self):
+        """Drops the prefetched value, e.g. before reseeding"""
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            try:
+                pending[1].result()
+            except Exception:
+                pass
+
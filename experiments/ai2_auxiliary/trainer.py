@@ -7,6 +7,10 @@ import torch
 
 
 def compute_auxiliary_target(observations, cell_size = 4, output_size = None):
+    if output_size is not None and tuple(observations.size()[3:]) == tuple(output_size):
+        # The environment already pooled the target to the prediction size
+        return observations
+
     with torch.no_grad():
         observations = autocrop_observations(observations, cell_size, output_size = output_size).contiguous()
         obs_shape = observations.size()
@@ -18,21 +22,67 @@ def compute_auxiliary_targets(observations, cell_size, output_size):
     observations = observations[0]
     return tuple(map(lambda x: compute_auxiliary_target(x, cell_size, output_size), observations[2:]))
 
+class FusedAuxiliaryModel:
+    """Computes the deconv heads in the pixel control pass
+
+    Used when the auxiliary batch is the pixel control batch and the model
+    has deconv heads, the deconv predictions are taken from the same conv
+    pass by `_deconv_loss`.
+    """
+    def __init__(self, model):
+        self._model = model
+        self._deconv = None
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+    def __call__(self, *args, **kwargs):
+        return self._model(*args, **kwargs)
+
+    def pixel_control(self, inputs, masks, states):
+        outputs = self._model.forward_heads(inputs, masks, states, heads = ('pixel_control', 'deconv'))
+        self._deconv = (inputs[0][0], outputs['deconv'])
+        return outputs['pixel_control'], outputs['states']
+
+    def fused_deconv(self, inputs):
+        """Returns the deconv predictions if they were computed for the same inputs"""
+        if self._deconv is None:
+            return None
+        image, predictions = self._deconv
+        if image.size() != inputs[0][0].size() or not torch.equal(image, inputs[0][0]):
+            return None
+        return predictions
+
+
 class AuxiliaryTrainer(UnrealTrainer):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
         self.auxiliary_weight = 0.05
+        # When set, the deconv loss uses the pixel control batch and both heads share one forward pass
+        self.share_auxiliary_batch = False
 
     def sample_training_batch(self):
         values, report = super().sample_training_batch()
-        aux_batch = self.replay.sample_sequence() if self.auxiliary_weight > 0.0 else None
+        aux_batch = None
+        is_pixel_control_batch = False
+        if self.auxiliary_weight > 0.0:
+            aux_batch = values.get('pixel_control_batch') if self.share_auxiliary_batch else None
+            is_pixel_control_batch = aux_batch is not None
+            if aux_batch is None:
+                aux_batch = self.replay.sample_sequence()
         values['auxiliary_batch'] = aux_batch
+        # The batches are copied to the device later, so the sharing is marked explicitly
+        values['auxiliary_batch_is_pc'] = is_pixel_control_batch
         return values, report
 
     def compute_auxiliary_loss(self, model, batch, main_device):
-        loss, losses = super().compute_auxiliary_loss(model, batch, main_device)
         auxiliary_batch = batch.get('auxiliary_batch')
+        if auxiliary_batch is not None and bool(batch.get('auxiliary_batch_is_pc', False)) and \
+                hasattr(model, 'forward_heads') and hasattr(model, '_deconv_heads'):
+            model = FusedAuxiliaryModel(model)
+
+        loss, losses = super().compute_auxiliary_loss(model, batch, main_device)
 
         # Compute pixel change gradients
         if not auxiliary_batch is None:
@@ -47,7 +97,9 @@ class AuxiliaryTrainer(UnrealTrainer):
         observations = without_last_item(observations)
         masks = torch.ones(rewards.size(), dtype = torch.float32, device = device)
         initial_states = to_tensor(self._initial_states(masks.size()[0]), device)
-        predictions, _ = model.forward_deconv(observations, masks, initial_states)
+        predictions = model.fused_deconv(observations) if isinstance(model, FusedAuxiliaryModel) else None
+        if predictions is None:
+            predictions, _ = model.forward_deconv(observations, masks, initial_states)
         targets = compute_auxiliary_targets(observations, model.deconv_cell_size, predictions[0].size()[3:])
         loss = 0
         for prediction, target in zip(predictions, targets):
@@ -71,6 +71,7 @@ class Trainer(AuxiliaryTrainer):
     def process(self, *args, **kwargs):
         a, b, metric_context = super().process(*args, **kwargs)
         self.env.set_hardness(self.scene_complexity)
+        self.env.rebalance_scenes()
         metric_context.add_last_value_scalar('scene_complexity', self.scene_complexity)
         return a, b, metric_context
 
@@ -83,7 +84,7 @@ def create_envs(num_training_processes, env_kwargs):
         env = UnrealEnvBaseWrapper(env)
         return env
 
-    env = create_multiscene(num_training_processes, TRAIN2, wrap = wrap, **env_kwargs)
+    env = create_multiscene(num_training_processes, TRAIN2, wrap = wrap, balance_scenes = True, **env_kwargs)
     env.set_hardness = lambda hardness: env.call_unwrapped('set_hardness', hardness)
     val_env = create_multiscene(VALIDATION_PROCESSES, VALIDATION2, wrap = wrap, **env_kwargs)
     val_env.set_hardness = lambda hardness: val_env.call_unwrapped('set_hardness', hardness)
@@ -95,6 +96,8 @@ def default_args():
         env_kwargs = dict(
             id = 'AuxiliaryGoalHouse-v1', 
             screen_size=(172,172), 
+            # Depth and segmentation targets are pooled to the deconv output size in the workers
+            auxiliary_target_size = (42, 42),
             enable_noise = True,
             hardness = 0.3,
             configuration=deep_rl.configuration.get('house3d').as_dict()),
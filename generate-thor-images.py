@@ -0,0 +1,20 @@
+import argparse
+import os
+import download
+from environments.gym_ai2thor._register_downloads import scene_image_resources
+from environments.gym_ai2thor.scene_images import generate_scene_images
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Renders THOR goal images of many scenes in parallel.')
+    parser.add_argument('--scenes', type = str, nargs = '*', default = None, help = 'Scenes to render, e.g. --scenes 28 311, all by default')
+    parser.add_argument('--processes', type = int, default = None, help = 'Number of worker processes')
+    parser.add_argument('--shards', action = 'store_true', help = 'Pack the images into goal shards instead of png files')
+    parser.add_argument('--size', type = int, nargs = '+', default = [84], help = 'Image sizes (square) of the shards, e.g. --size 84 172')
+    args = parser.parse_args()
+
+    root = download.downloader.resources_path
+    scenes = { scene: (os.path.join(root, 'thor-scene-images-' + scene), name) for scene, name in scene_image_resources() if args.scenes is None or scene in args.scenes }
+    generate_scene_images(scenes,
+        processes = args.processes,
+        shard_root = os.path.join(root, 'thor-goal-shards') if args.shards else None,
+        shard_sizes = [(x, x) for x in args.size])
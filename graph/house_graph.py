@@ -0,0 +1,117 @@
+import numpy as np
+from collections import deque
+from graph.thor_graph import ThorGridWorld
+
+# Heading of the grid directions used by ThorGridWorld, direction 0 moves along the first grid axis
+DIRECTION_YAWS = [0, 90, 180, 270]
+
+
+class HouseGridWorldReconstructor:
+    """Discretizes a SUNCG house into a ThorGridWorld lookup scene
+
+    The movable map of the house is sampled every grid_size meters, the largest
+    connected component is kept and rgb, depth and semantic frames are rendered
+    for all four headings of every cell. Two neighbouring cells are connected
+    if the straight line between them is movable, the maze only stores the
+    cells, so the cells behind thin walls are dropped with the other components
+    when they are not reachable otherwise.
+    """
+    def __init__(self, house_id, room_types = ['kitchen'], grid_size = 0.5, screen_size = (84, 84), configuration = None, device = 0):
+        self.house_id = house_id
+        self.room_types = room_types
+        self.grid_size = grid_size
+        self.screen_size = screen_size
+        self.configuration = configuration
+        self.device = device
+
+    def _initialize(self):
+        from House3D.core import Environment
+        from House3D.objrender import RenderAPIThread as RenderAPI
+        from environments.gym_house.env import create_configuration
+        self._config = create_configuration(self.configuration)
+        h, w = self.screen_size
+        self._api = RenderAPI(w = w, h = h, device = self.device)
+        self._env = Environment(self._api, self.house_id, self._config)
+        self._house = self._env.house
+
+    def _can_move(self, a, b):
+        # All fine cells on the segment between two coarse cells have to be movable
+        steps = max(abs(b[0] - a[0]), abs(b[1] - a[1]), 1)
+        for t in range(steps + 1):
+            x = a[0] + (b[0] - a[0]) * t // steps
+            y = a[1] + (b[1] - a[1]) * t // steps
+            if not self._house.canMove(x, y):
+                return False
+        return True
+
+    def _sample_cells(self):
+        house = self._house
+        step = max(1, int(round(self.grid_size / house.grid_det)))
+        movable = np.argwhere(house.moveMap > 0)
+        origin = movable.min(0)
+        size = (movable.max(0) - origin) // step + 1
+        fine = lambda cell: (int(origin[0] + cell[0] * step), int(origin[1] + cell[1] * step))
+        cells = set((i, j) for i in range(size[0]) for j in range(size[1]) if house.canMove(*fine((i, j))))
+
+        # Keep the largest component
+        components = []
+        unvisited = set(cells)
+        while unvisited:
+            start = unvisited.pop()
+            component, queue = [start], deque([start])
+            while queue:
+                cell = queue.popleft()
+                for dx, dy in ((1, 0), (0, 1), (-1, 0), (0, -1)):
+                    neighbour = (cell[0] + dx, cell[1] + dy)
+                    if neighbour in unvisited and self._can_move(fine(cell), fine(neighbour)):
+                        unvisited.remove(neighbour)
+                        component.append(neighbour)
+                        queue.append(neighbour)
+            components.append(component)
+
+        component = max(components, key = len, default = [])
+        return { cell: fine(cell) for cell in component }
+
+    def _render(self, position, direction):
+        x, y = self._house.to_coor(position[0], position[1], True)
+        self._env.reset(x, y, DIRECTION_YAWS[direction])
+        rgb = self._env.render(mode = 'rgb', copy = True)
+        depth = self._env.render(mode = 'depth', copy = True)[..., 0:1]
+        semantic = self._env.render(mode = 'semantic', copy = True)
+        return rgb, depth, semantic
+
+    def _room_goals(self, cells):
+        from environments.gym_house.house_cache import set_target_room
+        goals = dict()
+        for room_type in self.room_types:
+            if room_type not in self._house.all_desired_roomTypes:
+                continue
+            set_target_room(self._house, room_type, self._config)
+            goals[room_type] = [cell + (d,) for cell, position in sorted(cells.items()) for d in range(4) if self._house.connMap[position] == 0]
+        return goals
+
+    def reconstruct(self):
+        self._initialize()
+        cells = self._sample_cells()
+        print('Rendering %s cells of house %s' % (len(cells), self.house_id))
+
+        minx = min((x[0] for x in cells), default = 0)
+        miny = min((x[1] for x in cells), default = 0)
+        size = (max((x[0] for x in cells), default = 0) - minx + 1, max((x[1] for x in cells), default = 0) - miny + 1)
+        cells = { (key[0] - minx, key[1] - miny): value for key, value in cells.items() }
+
+        observations = np.zeros(size + (4,) + tuple(self.screen_size) + (3,), dtype = np.uint8)
+        segmentations = np.zeros(size + (4,) + tuple(self.screen_size) + (3,), dtype = np.uint8)
+        depths = np.zeros(size + (4,) + tuple(self.screen_size) + (1,), dtype = np.uint8)
+        grid = np.zeros(size, dtype = np.bool)
+        for cell, position in cells.items():
+            for d in range(4):
+                observations[cell + (d,)], depths[cell + (d,)], segmentations[cell + (d,)] = self._render(position, d)
+            grid[cell] = 1
+
+        graph = ThorGridWorld(grid, observations, depths, segmentations)
+        graph.room_goals = self._room_goals(cells)
+        graph.goals = [x for room_type in self.room_types for x in graph.room_goals.get(room_type, [])]
+        if len(graph.goals) == 0:
+            print('WARNING: House %s has no cells in rooms %s' % (self.house_id, ', '.join(self.room_types)))
+        return graph
@@ -71,6 +71,7 @@ class GridWorldReconstructor:
             return (dir1, dir2 - 1)
 
     def _collect_spot(self, position):
+        from environments.util import depth_to_uint8
         if position in self._collected_positions:
             return
 
@@ -82,7 +83,7 @@ class GridWorldReconstructor:
         # Collect all four images in all directions
         for d in range(4):
             event = self._controller.step(dict(action='RotateRight'))
-            depth = np.expand_dims((event.depth_frame * 255 / 5000).astype(np.uint8), 2)
+            depth = np.expand_dims(depth_to_uint8(event.depth_frame), 2)
             frames[(1 + d) % 4] = (event.frame, depth, event.class_segmentation_frame,)
 
         self._realcoordinates[position] = event.metadata['agent']['position']
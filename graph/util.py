@@ -1,5 +1,6 @@
 import numpy as np
 from operator import add
+from collections import deque
 
 def direction_to_change(direction):
     if direction == 0:
@@ -122,34 +123,31 @@ def sample_initial_state(graph, goal, optimal_distance = None):
 
 
 def compute_shortest_path_data(maze):
+    """Computes distances and optimal actions between all pairs of cells
+
+    Runs a breadth first search from every goal. optimal_actions[position + goal + (direction,)]
+    is True if moving in the direction gets one step closer to the goal.
+    """
     distances = np.ndarray(maze.shape + maze.shape, dtype = np.int32)
     actions = np.ndarray(maze.shape + maze.shape + (4,), dtype = np.bool)
     distances.fill(-1)
     actions.fill(False)
-    def fill_shortest_path(goal, position, distance, from_direction):
-        if not is_valid_state(maze, position):
-            return 
-
-        if distances[position + goal] != -1 and distances[position + goal] < distance:
-            return
-
-        if distances[position + goal] == distance:
-            actions[position + goal + ((from_direction + 2) % 4,)] = True
-            return            
-        
-        actions[position + goal] = False
-        actions[position + goal + ((from_direction + 2) % 4,)] = True
-        distances[position + goal] = distance
-
-        fill_shortest_path(goal, tuple(map(add, position, direction_to_change(0))), distance + 1, 0)
-        fill_shortest_path(goal, tuple(map(add, position, direction_to_change(1))), distance + 1, 1)
-        fill_shortest_path(goal, tuple(map(add, position, direction_to_change(2))), distance + 1, 2)
-        fill_shortest_path(goal, tuple(map(add, position, direction_to_change(3))), distance + 1, 3)
-        
-
+    changes = [direction_to_change(x) for x in range(4)]
     for goal in enumerate_positions(maze):
-        fill_shortest_path(goal, goal, 0, 0)
-        actions[goal + goal] = False
+        distances[goal + goal] = 0
+        queue = deque([goal])
+        while queue:
+            position = queue.popleft()
+            distance = distances[position + goal] + 1
+            for direction, change in enumerate(changes):
+                neighbour = (position[0] + change[0], position[1] + change[1])
+                if not is_valid_state(maze, neighbour):
+                    continue
+                if distances[neighbour + goal] == -1:
+                    distances[neighbour + goal] = distance
+                    queue.append(neighbour)
+                if distances[neighbour + goal] == distance:
+                    actions[neighbour + goal + ((direction + 2) % 4,)] = True
 
     return distances, actions
 
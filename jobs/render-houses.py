@@ -8,6 +8,7 @@ import tqdm
 import cv2
 import numpy as np
 import os
+import sys
 import csv
 import queue
 import time
@@ -17,6 +18,8 @@ from House3D import objrender, Environment, House
 from House3D.objrender import RenderMode
 from threading import Thread, Lock
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
 RANDOM_SEED = 0
 
 MAX_QSIZE = 20
@@ -67,7 +70,14 @@ def load_target_object_data(roomTargetFile):
     return room_target_object
 
 def create_house(houseID, config, robotRadius=ROBOT_RAD):
+    from environments.gym_house.house_cache import load_house
     print('Loading house {}'.format(houseID))
+    return load_house(houseID, config,
+        create = lambda houseID, config: _create_house(houseID, config, robotRadius),
+        variant = 'restricted-r%s' % robotRadius)
+
+
+def _create_house(houseID, config, robotRadius=ROBOT_RAD):
     objFile = os.path.join(config['prefix'], houseID, 'house.obj')
     jsonFile = os.path.join(config['prefix'], houseID, 'house.json')
     assert (
@@ -67,6 +67,30 @@ class BigHouseModel(nn.Module):
         critic = self.critic(features)
         return [policy_logits, critic, states]
 
+    def forward_heads(self, inputs, masks, states, heads = ('policy_logits', 'value')):
+        """Computes the requested heads from a single conv and LSTM pass
+
+        Supported heads are policy_logits, value, pixel_control and reward_prediction
+        (the batch has to be reward prediction sequences). Returns a dict with the heads
+        and the new LSTM states, which are None if no recurrent head was requested.
+        """
+        observations, last_reward_action = inputs
+        features = self.conv_base(observations)
+        outputs = dict(states = None)
+        if 'reward_prediction' in heads:
+            outputs['reward_prediction'] = self.rp(features.view(features.size()[0], -1))
+        if any(x in heads for x in ('policy_logits', 'value', 'pixel_control')):
+            features = self.conv_merge(features)
+            features = torch.cat((features, last_reward_action,), dim = 2)
+            features, outputs['states'] = self.rnn(features, masks, states)
+            if 'policy_logits' in heads:
+                outputs['policy_logits'] = self.policy_logits(features)
+            if 'value' in heads:
+                outputs['value'] = self.critic(features)
+            if 'pixel_control' in heads:
+                outputs['pixel_control'] = self._pixel_control_head(features)
+        return outputs
+
     def _forward_base(self, inputs, masks, states):
         observations, last_reward_action = inputs
         features = self.conv_base(observations)
@@ -102,11 +126,13 @@ class BigHouseModel(nn.Module):
 
     def pixel_control(self, inputs, masks, states):
         features, states = self._forward_base(inputs, masks, states)
+        return self._pixel_control_head(features), states
+
+    def _pixel_control_head(self, features):
         features = self.pc_base(features)
         features = features.view(*(features.size()[:2] + (32, 9, 9)))
         action_features = self.pc_action(features)
-        features = self.pc_value(features) + action_features - action_features.mean(2, keepdim=True)
-        return features, states
+        return self.pc_value(features) + action_features - action_features.mean(2, keepdim=True)
 
     def value_prediction(self, inputs, masks, states):
         features, states = self._forward_base(inputs, masks, states)
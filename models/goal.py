@@ -71,6 +71,9 @@ class BigGoalHouseModel(nn.Module):
         self.apply(self.init_weights)
         self.pc_cell_size = 4
 
+        # Goal image, its features and the weights version from the last call without gradients
+        self._goal_cache = None
+
     def initial_states(self, batch_size):
         return tuple([torch.zeros([batch_size, self.lstm_layers, self.lstm_hidden_size], dtype = torch.float32) for _ in range(2)])
 
@@ -80,12 +83,89 @@ class BigGoalHouseModel(nn.Module):
         critic = self.critic(features)
         return [policy_logits, critic, states]
 
+    def forward_heads(self, inputs, masks, states, heads = ('policy_logits', 'value')):
+        """Computes the requested heads from a single conv and LSTM pass
+
+        Supported heads are policy_logits, value, pixel_control and reward_prediction
+        (the batch has to be reward prediction sequences). Returns a dict with the heads
+        and the new LSTM states, which are None if no recurrent head was requested.
+        """
+        observations, last_reward_action = inputs
+        features = self._shared_features(observations[0], observations[1], masks)
+        features = self.conv_base(features)
+        outputs = self._conv_heads(features, heads)
+        outputs['states'] = None
+        if any(x in heads for x in ('policy_logits', 'value', 'pixel_control')):
+            features = self.conv_merge(features)
+            features = torch.cat((features, last_reward_action,), dim = 2)
+            features, outputs['states'] = self.rnn(features, masks, states)
+            if 'policy_logits' in heads:
+                outputs['policy_logits'] = self.policy_logits(features)
+            if 'value' in heads:
+                outputs['value'] = self.critic(features)
+            if 'pixel_control' in heads:
+                outputs['pixel_control'] = self._pixel_control_head(features)
+        return outputs
+
+    def _conv_heads(self, features, heads):
+        outputs = dict()
+        if 'reward_prediction' in heads:
+            outputs['reward_prediction'] = self.rp(features)
+        return outputs
+
+    def _shared_base_version(self):
+        # Changes with every in-place update of the weights (optimizer steps, loading a state dict)
+        return tuple(x._version for x in self.shared_base.parameters())
+
+    def _goal_segments(self, goal, masks):
+        # A segment starts at a mask boundary or where the goal image changes
+        batch, steps = goal.size()[:2]
+        flat = goal.reshape(batch, steps, -1)
+        starts = torch.zeros((batch, steps), dtype = torch.bool, device = goal.device)
+        starts[:, 1:] = (flat[:, 1:] != flat[:, :-1]).any(2)
+        if masks is not None:
+            starts |= masks.reshape(batch, steps) == 0
+
+        cache = self._goal_cache if not torch.is_grad_enabled() else None
+        if cache is not None and cache[0].size() == flat[:, 0].size() and cache[0].device == goal.device and cache[2] == self._shared_base_version():
+            starts[:, 0] |= (flat[:, 0] != cache[0]).any(1)
+            return starts, cache[1]
+
+        starts[:, 0] = True
+        return starts, None
+
+    def _shared_features(self, image, goal, masks = None):
+        """Returns the shared_base features of the image and the goal concatenated along channels
+
+        The goal is constant during an episode, so only the first goal frame of every
+        segment goes through shared_base, together with all image frames in one batch.
+        Without gradients (acting) segments continue from the previous call.
+        """
+        batch, steps = image.size()[:2]
+        starts, previous = self._goal_segments(goal, masks)
+        new_goals = goal.reshape(batch * steps, *goal.size()[2:])[starts.view(-1)]
+        features = torch.cat((image.reshape(batch * steps, *image.size()[2:]), new_goals), 0)
+        features = self.shared_base(features.unsqueeze(1)).squeeze(1)
+        image, goal_features = features[:batch * steps], features[batch * steps:]
+
+        # Index of the segment features of every frame, frames continuing the previous call use its features
+        index = torch.cumsum(starts.view(-1).long(), 0) - 1
+        if previous is not None:
+            started = (torch.cumsum(starts.long(), 1) > 0).view(-1)
+            continued = torch.arange(batch, device = goal.device).repeat_interleave(steps)
+            index = torch.where(started, index + batch, continued)
+            goal_features = torch.cat((previous, goal_features), 0)
+        goal_features = goal_features[index]
+        goal_features = goal_features.view(batch, steps, *goal_features.size()[1:])
+        if not torch.is_grad_enabled():
+            self._goal_cache = (goal[:, -1].reshape(batch, -1).clone(), goal_features[:, -1], self._shared_base_version())
+
+        image = image.view(batch, steps, *image.size()[1:])
+        return torch.cat((image, goal_features), 2)
+
     def _forward_base(self, inputs, masks, states):
         observations, last_reward_action = inputs
-        image = observations[0]
-        goal = observations[1]
-        image, goal = self.shared_base(image), self.shared_base(goal)
-        features = torch.cat((image, goal), 2)
+        features = self._shared_features(observations[0], observations[1], masks)
         features = self.conv_base(features)
         features = self.conv_merge(features)
         features = torch.cat((features, last_reward_action,), dim = 2)
@@ -120,21 +200,20 @@ class BigGoalHouseModel(nn.Module):
 
     def reward_prediction(self, inputs):
         observations, _ = inputs
-        image = observations[0]
-        goal = observations[1]
-        image, goal = self.shared_base(image), self.shared_base(goal)
-        features = torch.cat((image, goal), 2)
+        features = self._shared_features(observations[0], observations[1])
         features = self.conv_base(features)
         features = self.rp(features)
         return features
 
     def pixel_control(self, inputs, masks, states):
         features, states = self._forward_base(inputs, masks, states)
+        return self._pixel_control_head(features), states
+
+    def _pixel_control_head(self, features):
         features = self.pc_base(features)
         features = features.view(*(features.size()[:2] + (32, 9, 9)))
         action_features = self.pc_action(features)
-        features = self.pc_value(features) + action_features - action_features.mean(2, keepdim=True)
-        return features, states
+        return self.pc_value(features) + action_features - action_features.mean(2, keepdim=True)
 
     def value_prediction(self, inputs, masks, states):
         features, states = self._forward_base(inputs, masks, states)
@@ -176,14 +255,18 @@ class AuxiliaryBigGoalHouseModel(BigGoalHouseModel):
     
     def forward_deconv(self, inputs, masks, states):
         observations, _ = inputs
-        image = observations[0]
-        goal = observations[1]
-        image, goal = self.shared_base(image), self.shared_base(goal)
-        features = torch.cat((image, goal), 2)
+        features = self._shared_features(observations[0], observations[1], masks)
         features = self.conv_base(features)
+        return self._deconv_heads(features), states
 
-        # heads
+    def _deconv_heads(self, features):
         depth = self.deconv_depth(features)
         mask = self.deconv_mask(features)
         mask_goal = self.deconv_mask_goal(features)
-        return (depth, mask, mask_goal), states
\ No newline at end of file
+        return (depth, mask, mask_goal)
+
+    def _conv_heads(self, features, heads):
+        outputs = super()._conv_heads(features, heads)
+        if 'deconv' in heads:
+            outputs['deconv'] = self._deconv_heads(features)
+        return outputs
\ No newline at end of file
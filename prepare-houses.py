@@ -0,0 +1,21 @@
+import argparse
+from configuration import configuration
+from environments.gym_house.env import create_configuration
+from environments.gym_house.house_cache import prepare_connmaps
+import experiments.data as data
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Builds the house and connectivity map caches of the House3D scenes.')
+    parser.add_argument('--scenes', type = str, default = None, help = 'Comma separated scene lists from experiments/data.py (default: all of them)')
+    parser.add_argument('--processes', type = int, default = None, help = 'Number of worker processes')
+    args = parser.parse_args()
+
+    lists = [x for x in dir(data) if x.isupper()] if args.scenes is None else args.scenes.split(',')
+    houses = []
+    for name in lists:
+        for house in getattr(data, name):
+            if house not in houses:
+                houses.append(house)
+
+    config = create_configuration(configuration.get('house3d'))
+    prepare_connmaps(houses, config, processes = args.processes)
@@ -5,6 +5,7 @@ from configuration import configuration
 from deep_rl.common.torchsummary import get_shape
 import os
 from environments.gym_house.video import RenderVideoWrapper
+from environments.gym_house.trajectory import TrajectoryLogWrapper
 import environments
 
 EXPERIMENTS = [
@@ -35,11 +36,15 @@ EXPERIMENTS = [
     ])
 ]'''
 
-def record_videos(agent, path, screen_size):
+def record_videos(agent, path, screen_size, log = False):
     seed = 1
     for scene, tasks in EXPERIMENTS:
         env = environments.make('GoalHouse-v1', screen_size = screen_size, scene = scene, goals = None)
-        env = RenderVideoWrapper(env, path)
+        if log:
+            # Videos are rendered later by render-trajectories.py
+            env = TrajectoryLogWrapper(env, os.path.join(path, 'trajectories-%s.bin' % scene))
+        else:
+            env = RenderVideoWrapper(env, path)
         env = agent.wrap_env(env)
         env.seed(seed)
         for task in tasks:
@@ -53,12 +58,16 @@ def record_videos(agent, path, screen_size):
             while not done:
                 obs, _, done, _ = env.step(agent.act(obs))
 
+        # Waits for the videos being written in the background and closes the log
+        env.close()
+
 
 if __name__ == '__main__':
     deep_rl.configure(**configuration)
 
     parser = argparse.ArgumentParser()
     parser.add_argument('name', type = str, help = 'Experiment name')
+    parser.add_argument('--log', action = 'store_true', help = 'Only log the trajectories instead of rendering videos')
     args = parser.parse_args()
     name = args.name
 
@@ -71,4 +80,4 @@ if __name__ == '__main__':
     os.makedirs(videos_path, exist_ok=True)
 
     agent = make_agent(name)
-    record_videos(agent, videos_path, screen_size)
\ No newline at end of file
+    record_videos(agent, videos_path, screen_size, log = args.log)
\ No newline at end of file
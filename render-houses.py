@@ -44,7 +44,13 @@ class RestrictedHouse(House):
 
 
 def create_house(houseID, config, robotRadius=ROBOT_RAD):
+    from environments.gym_house.house_cache import load_house
     print('Loading house {}'.format(houseID))
+    return load_house(houseID, config,
+        create = lambda houseID, config: _create_house(houseID, config, robotRadius),
+        variant = 'restricted-r%s' % robotRadius)
+
+def _create_house(houseID, config, robotRadius=ROBOT_RAD):
     objFile = os.path.join(config['prefix'], houseID, 'house.obj')
     jsonFile = os.path.join(config['prefix'], houseID, 'house.json')
     assert (
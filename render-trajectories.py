@@ -0,0 +1,60 @@
+import argparse
+import multiprocessing
+import os
+import time
+from configuration import configuration
+
+_worker = dict()
+
+def _init_worker(size, action_frames):
+    from House3D.objrender import RenderAPIThread as RenderAPI
+    from environments.gym_house.env import create_configuration
+    height, width = size
+    _worker['api'] = RenderAPI(w = width, h = height, device = 0)
+    _worker['config'] = create_configuration(configuration.get('house3d'))
+    _worker['size'] = size
+    _worker['action_frames'] = action_frames
+    _worker['renderer'] = (None, None)
+
+def _render_trajectory(args):
+    from House3D.core import Environment
+    from environments.gym_house.video import render_states_video
+    output_path, trajectory = args
+
+    # One renderer per worker, reused while the house stays the same
+    if _worker['renderer'][0] != trajectory.house_id:
+        _worker['renderer'] = (trajectory.house_id, Environment(_worker['api'], trajectory.house_id, _worker['config']))
+    renderer = _worker['renderer'][1]
+    renderer.reset()
+    render_states_video(renderer, trajectory.states, output_path, _worker['size'], _worker['action_frames'])
+    return output_path
+
+if __name__ == '__main__':
+    from environments.gym_house.trajectory import read_trajectories
+
+    parser = argparse.ArgumentParser(description = 'Renders logged House3D trajectories to videos.')
+    parser.add_argument('logs', type = str, nargs = '+', help = 'Trajectory logs written by TrajectoryLogWrapper')
+    parser.add_argument('--output', type = str, required = True, help = 'Output directory')
+    parser.add_argument('--processes', type = int, default = None, help = 'Number of worker processes')
+    parser.add_argument('--width', type = int, default = 500)
+    parser.add_argument('--height', type = int, default = 500)
+    parser.add_argument('--action-frames', type = int, default = 10, help = 'Interpolated frames per action')
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok = True)
+    jobs = []
+    for log in args.logs:
+        name = os.path.splitext(os.path.basename(log))[0]
+        for i, trajectory in enumerate(read_trajectories(log)):
+            jobs.append((os.path.join(args.output, '%s-vid-%s.avi' % (name, i + 1)), trajectory))
+
+    # Trajectories of the same house go to the same worker when possible
+    jobs.sort(key = lambda x: x[1].house_id)
+
+    print('Rendering %s trajectories ...' % len(jobs))
+    ts = time.time()
+    processes = args.processes or multiprocessing.cpu_count()
+    with multiprocessing.Pool(processes, initializer = _init_worker, initargs = ((args.height, args.width), args.action_frames)) as pool:
+        for output_path in pool.imap_unordered(_render_trajectory, jobs, chunksize = max(1, len(jobs) // (4 * processes))):
+            print('Written %s' % output_path)
+    print('  >> Done! Time Elapsed = %.4f(s)' % (time.time() - ts))
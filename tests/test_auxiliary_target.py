@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+util = pytest.importorskip('environments.util')
+
+
+class _Env(util.AuxiliaryTargetMixin):
+    def __init__(self, auxiliary_target_size, auxiliary_cell_size = 4):
+        self.screen_size = (172, 172)
+        self._set_auxiliary_target(auxiliary_target_size, auxiliary_cell_size)
+
+
+def test_pool_auxiliary_target_averages_centered_cells():
+    image = np.random.RandomState(0).randint(0, 255, (172, 172, 3)).astype(np.uint8)
+    pooled = util.pool_auxiliary_target(image, (42, 42), 4)
+    expected = image[2:170, 2:170].astype(np.float32).reshape(42, 4, 42, 4, 3).mean((1, 3))
+    assert pooled.shape == (42, 42, 3)
+    assert np.abs(pooled.astype(np.float32) - expected).max() <= 1.0
+
+
+def test_pool_auxiliary_target_keeps_channel_axis():
+    image = np.zeros((172, 172, 1), dtype = np.uint8)
+    assert util.pool_auxiliary_target(image, (42, 42), 4).shape == (42, 42, 1)
+
+
+def test_mixin_passes_frames_through_without_target_size():
+    env = _Env(None)
+    image = np.zeros((172, 172, 3), dtype = np.uint8)
+    assert env._auxiliary_target(image) is image
+    assert env.auxiliary_target_shape == (172, 172)
+
+
+def test_mixin_pools_to_target_size():
+    env = _Env((42, 42))
+    assert env._auxiliary_target(np.zeros((172, 172, 3), dtype = np.uint8)).shape == (42, 42, 3)
+    assert env.auxiliary_target_shape == (42, 42)
+
+
+def test_trainer_keeps_pooled_targets():
+    torch = pytest.importorskip('torch')
+    trainer = pytest.importorskip('experiments.ai2_auxiliary.trainer')
+    observations = torch.rand(2, 5, 3, 42, 42)
+    assert trainer.compute_auxiliary_target(observations, 4, (42, 42)) is observations
+
+
+def test_trainer_fuses_pixel_control_and_deconv_passes(monkeypatch):
+    torch = pytest.importorskip('torch')
+    trainer = pytest.importorskip('experiments.ai2_auxiliary.trainer')
+
+    class Model:
+        deconv_cell_size = 4
+        calls = []
+
+        def forward_heads(self, inputs, masks, states, heads):
+            self.calls.append(heads)
+            batch, steps = masks.size()
+            return dict(pixel_control = torch.zeros(batch, steps, 4, 10, 10), deconv = (torch.zeros(batch, steps, 1, 10, 10),), states = states)
+
+        def forward_deconv(self, inputs, masks, states):
+            raise AssertionError('The deconv heads have to be computed in the pixel control pass')
+
+        def _deconv_heads(self, features):
+            pass
+
+    def compute_auxiliary_loss(self, model, batch, main_device):
+        observations, _, rewards, _ = batch['pixel_control_batch']
+        masks = torch.ones(rewards.size())
+        model.pixel_control(trainer.without_last_item(observations), masks, None)
+        return torch.tensor(0.0), dict()
+
+    monkeypatch.setattr(trainer.UnrealTrainer, 'compute_auxiliary_loss', compute_auxiliary_loss)
+    auxiliary_trainer = trainer.AuxiliaryTrainer.__new__(trainer.AuxiliaryTrainer)
+    auxiliary_trainer.auxiliary_weight = 0.05
+    auxiliary_trainer._initial_states = lambda size: None
+    monkeypatch.setattr(trainer, 'to_tensor', lambda value, device: value)
+
+    observations = ((torch.rand(2, 6, 3, 40, 40), torch.rand(2, 6, 3, 40, 40), torch.rand(2, 6, 1, 10, 10)), torch.zeros(2, 6, 5))
+    pc_batch = (observations, torch.zeros(2, 5), torch.zeros(2, 5), torch.zeros(2, 5))
+    batch = dict(pixel_control_batch = pc_batch, auxiliary_batch = pc_batch, auxiliary_batch_is_pc = True)
+    _, losses = auxiliary_trainer.compute_auxiliary_loss(Model(), batch, torch.device('cpu'))
+    assert Model.calls == [('pixel_control', 'deconv')]
+    assert 'aux_loss' in losses
@@ -0,0 +1,182 @@
+import io
+import os
+import json
+import hashlib
+import zipfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+
+pytest.importorskip('requests')
+download = pytest.importorskip('download')
+
+
+def _archive(files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as z:
+        for name, content in files.items():
+            z.writestr(name, content)
+    return buffer.getvalue()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    files = dict()
+    requests = []
+    # 'range' honours Range, 'ignore-range' answers 200 with the whole file, 'wrong-range' answers 206 from byte zero
+    mode = 'range'
+
+    def do_GET(self):
+        name = self.path.lstrip('/')
+        self.requests.append((name, self.headers.get('Range')))
+        if name not in self.files:
+            self.send_error(404)
+            return
+
+        content = self.files[name]
+        status, start = 200, 0
+        if self.headers.get('Range') is not None and self.mode != 'ignore-range':
+            start = int(self.headers['Range'][len('bytes='):].rstrip('-'))
+            if start >= len(content):
+                self.send_response(416)
+                self.send_header('Content-Range', 'bytes */%s' % len(content))
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            status = 206
+            if self.mode == 'wrong-range':
+                start = 0
+
+        self.send_response(status)
+        if status == 206:
+            self.send_header('Content-Range', 'bytes %s-%s/%s' % (start, len(content) - 1, len(content)))
+        self.send_header('Content-Length', str(len(content) - start))
+        self.end_headers()
+        self.wfile.write(content[start:])
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    _Handler.files = dict()
+    _Handler.requests = []
+    _Handler.mode = 'range'
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    thread = threading.Thread(target = httpd.serve_forever, daemon = True)
+    thread.start()
+    base_url = 'http://127.0.0.1:%s/' % httpd.server_address[1]
+    yield base_url, _Handler
+    httpd.shutdown()
+    httpd.server_close()
+    download._manifests.pop(base_url, None)
+
+
+def _context(base_url, tmp_path, name):
+    resources_path = str(tmp_path / 'resources')
+    return download.DownloaderContext(base_url, resources_path, os.path.join(resources_path, name))
+
+
+def test_download_file_resumes_with_range(server, tmp_path):
+    base_url, handler = server
+    content = os.urandom(3000)
+    handler.files['data.bin'] = content
+    path = str(tmp_path / 'data.bin')
+    with open(path, 'wb') as f:
+        f.write(content[:1000])
+
+    download.download_file(base_url + 'data.bin', path)
+    assert handler.requests == [('data.bin', 'bytes=1000-')]
+    with open(path, 'rb') as f:
+        assert f.read() == content
+
+
+def test_download_file_treats_416_as_complete(server, tmp_path):
+    base_url, handler = server
+    content = os.urandom(1000)
+    handler.files['data.bin'] = content
+    path = str(tmp_path / 'data.bin')
+    with open(path, 'wb') as f:
+        f.write(content)
+
+    download.download_file(base_url + 'data.bin', path)
+    assert handler.requests == [('data.bin', 'bytes=1000-')]
+    with open(path, 'rb') as f:
+        assert f.read() == content
+
+
+@pytest.mark.parametrize('mode', ['ignore-range', 'wrong-range'])
+def test_download_file_restarts_without_matching_range(server, tmp_path, mode):
+    base_url, handler = server
+    handler.mode = mode
+    content = os.urandom(3000)
+    handler.files['data.bin'] = content
+    path = str(tmp_path / 'data.bin')
+    with open(path, 'wb') as f:
+        f.write(content[:1000])
+
+    download.download_file(base_url + 'data.bin', path)
+    with open(path, 'rb') as f:
+        assert f.read() == content
+
+
+def test_download_file_restarts_after_416_of_other_size(server, tmp_path):
+    base_url, handler = server
+    content = os.urandom(1000)
+    handler.files['data.bin'] = content
+    path = str(tmp_path / 'data.bin')
+    with open(path, 'wb') as f:
+        f.write(os.urandom(1500))
+
+    download.download_file(base_url + 'data.bin', path)
+    assert handler.requests == [('data.bin', 'bytes=1500-'), ('data.bin', None)]
+    with open(path, 'rb') as f:
+        assert f.read() == content
+
+
+def _listdir(path):
+    return sorted(x for x in os.listdir(path) if not x.endswith('.lock'))
+
+
+def test_download_resource_verifies_checksum(server, tmp_path):
+    base_url, handler = server
+    handler.files['res.zip'] = _archive({ 'a.txt': 'a' })
+    handler.files[download.MANIFEST_NAME] = json.dumps({ 'res.zip': dict(sha256 = hashlib.sha256(b'other').hexdigest()) }).encode('utf-8')
+    context = _context(base_url, tmp_path, 'res')
+
+    with pytest.raises(IOError):
+        download.download_resource('res', context)
+    # The corrupted archive is not resumed
+    assert _listdir(context.resources_path) == []
+
+
+def test_download_resource_extracts_atomically(server, tmp_path, monkeypatch):
+    base_url, handler = server
+    archive = _archive({ 'a.txt': 'a', 'b/c.txt': 'c' })
+    handler.files['res.zip'] = archive
+    handler.files[download.MANIFEST_NAME] = json.dumps({ 'res.zip': dict(sha256 = hashlib.sha256(archive).hexdigest()) }).encode('utf-8')
+    context = _context(base_url, tmp_path, 'res')
+
+    extractall = zipfile.ZipFile.extractall
+    def failing_extractall(self, path, *args, **kwargs):
+        self.extract(self.namelist()[0], path)
+        raise OSError('Disk full')
+
+    monkeypatch.setattr(zipfile.ZipFile, 'extractall', failing_extractall)
+    with pytest.raises(OSError):
+        download.download_resource('res', context)
+    # Nothing partially extracted is left, the downloaded archive is kept for the next attempt
+    assert _listdir(context.resources_path) == ['res.zip.part']
+
+    monkeypatch.setattr(zipfile.ZipFile, 'extractall', extractall)
+    assert download.download_resource('res', context) == context.store_path
+    assert _listdir(context.resources_path) == ['res']
+    with open(os.path.join(context.store_path, 'b', 'c.txt')) as f:
+        assert f.read() == 'c'
+
+
+def test_requirements_are_unique():
+    downloader = download.Downloader()
+    for name in ['b', 'a', 'b']:
+        downloader.require(name)
+    assert downloader.requirements == ['b', 'a']
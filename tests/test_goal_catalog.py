@@ -0,0 +1,45 @@
+import os
+import pytest
+
+goal_catalog = pytest.importorskip('environments.goal_catalog')
+
+
+def _touch_samples(path, goal, samples):
+    os.makedirs(os.path.join(path, goal), exist_ok = True)
+    for sample in samples:
+        for mode in ['rgb', 'depth']:
+            open(os.path.join(path, goal, '%s-render_%s.png' % (sample, mode)), 'wb').close()
+
+
+def test_catalog_reuses_scan_stored_by_other_process(tmp_path, monkeypatch):
+    root = str(tmp_path / 'images')
+    _touch_samples(os.path.join(root, '311'), 'mug', ['1', '0'])
+    path = str(tmp_path / 'catalog.pkl')
+    # Both are created before any of them listed the scenes
+    first = goal_catalog.GoalCatalog(root, path)
+    second = goal_catalog.GoalCatalog(root, path)
+
+    first.refresh()
+    inode = os.stat(path).st_ino
+    listed = []
+    listdir = os.listdir
+    monkeypatch.setattr(goal_catalog.os, 'listdir', lambda x: listed.append(x) or listdir(x))
+    assert second.scene_names() == ['311']
+    assert second.samples('311', 'mug') == ['0', '1']
+    # The scan of the first catalog is loaded, nothing is listed or stored again
+    assert listed == []
+    assert os.stat(path).st_ino == inode
+
+
+def test_catalog_merges_scenes_of_other_process(tmp_path):
+    root = str(tmp_path / 'images')
+    _touch_samples(os.path.join(root, '311'), 'mug', ['0'])
+    _touch_samples(os.path.join(root, '312'), 'cup', ['0'])
+    path = str(tmp_path / 'catalog.pkl')
+    first = goal_catalog.GoalCatalog(root, path)
+    second = goal_catalog.GoalCatalog(root, path)
+
+    first.goals('311')
+    second.goals('312')
+    third = goal_catalog.GoalCatalog(root, path)
+    assert sorted(third._data['scenes'].keys()) == ['311', '312']
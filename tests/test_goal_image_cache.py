@@ -0,0 +1,30 @@
+import os
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip('cv2')
+goal_image_cache = pytest.importorskip('environments.goal_image_cache')
+from environments.goal_shards import GoalShards, MODES
+from environments.goal_catalog import GoalCatalog
+from environments.util import SharedArrayStore
+
+
+def test_reads_catalog_images_through_the_caches(tmp_path):
+    goal_path = tmp_path / 'images' / '311' / 'mug'
+    os.makedirs(str(goal_path))
+    for mode in MODES:
+        cv2.imwrite(str(goal_path / ('loc_1-render_%s.png' % mode)), np.full((16, 16, 3), 7, dtype = np.uint8))
+
+    store = SharedArrayStore('store', root = str(tmp_path))
+    cache = goal_image_cache.GoalImageCache((8, 8),
+        shards = GoalShards(str(tmp_path / 'shards'), (8, 8)),
+        catalog = GoalCatalog(str(tmp_path / 'images'), str(tmp_path / 'catalog.pkl')),
+        shared_store = store)
+
+    assert cache.all_goals('311') == ['mug']
+    (image, semantic), path = cache.fetch_random_with_semantic('311', 'mug')
+    assert image.shape == semantic.shape == (8, 8, 3)
+    assert path == str(goal_path / 'loc_1')
+    cache.fetch_random('311', 'mug')
+    assert cache.cache_stats['hits'] == 1
+    assert cache.cache_stats['shared_nbytes'] > 0
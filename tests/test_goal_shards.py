@@ -0,0 +1,29 @@
+import os
+import random
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip('cv2')
+goal_shards = pytest.importorskip('environments.goal_shards')
+goal_catalog = pytest.importorskip('environments.goal_catalog')
+
+
+def _render_tree(path, samples):
+    os.makedirs(os.path.join(path, 'mug'))
+    for i, sample in enumerate(samples):
+        for mode in goal_shards.MODES:
+            image = np.full((8, 8, 3), i, dtype = np.uint8)
+            cv2.imwrite(os.path.join(path, 'mug', '%s-render_%s.png' % (sample, mode)), image)
+
+
+def test_seeded_sampling_matches_between_shards_and_catalog(tmp_path):
+    scene_path = str(tmp_path / 'images' / '311')
+    _render_tree(scene_path, ['loc_10', 'loc_2', 'loc_1', 'loc_33', 'loc_4'])
+    goal_shards.build_scene_shard(scene_path, goal_shards.scene_shard_path(str(tmp_path / 'shards'), (8, 8), '311'), (8, 8))
+
+    shards = goal_shards.GoalShards(str(tmp_path / 'shards'), (8, 8))
+    catalog = goal_catalog.GoalCatalog(str(tmp_path / 'images'), str(tmp_path / 'catalog.pkl'))
+    assert shards.samples('311', 'mug') == catalog.samples('311', 'mug') == ['loc_1', 'loc_2', 'loc_4', 'loc_10', 'loc_33']
+
+    for seed in range(5):
+        assert random.Random(seed).choice(shards.samples('311', 'mug')) == random.Random(seed).choice(catalog.samples('311', 'mug'))
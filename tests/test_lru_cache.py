@@ -0,0 +1,66 @@
+import os
+import numpy as np
+import pytest
+
+util = pytest.importorskip('environments.util')
+
+
+def test_evicts_least_recently_used():
+    cache = util.LRUCache(max_items = 2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+    assert cache.keys() == ['a', 'c']
+    assert cache.stats['evictions'] == 1
+
+
+def test_byte_budget():
+    cache = util.LRUCache(max_bytes = 250)
+    for key in 'abc':
+        cache.put(key, np.zeros(100, dtype = np.uint8))
+    assert cache.keys() == ['b', 'c']
+    assert cache.nbytes == 200
+
+
+def test_keep_protects_pinned_keys():
+    cache = util.LRUCache(max_items = 1)
+    cache.put('current', 1)
+    cache.put('prefetched', 2, keep = ('current',))
+    assert set(cache.keys()) == {'current', 'prefetched'}
+    cache.put('next', 3)
+    assert cache.keys() == ['next']
+
+
+def test_shared_array_store_budget_is_shared(tmp_path):
+    first = util.SharedArrayStore('store', max_bytes = 3000, root = str(tmp_path))
+    second = util.SharedArrayStore('store', max_bytes = 3000, root = str(tmp_path))
+    assert first.put('a', np.zeros(1000, dtype = np.uint8))
+    assert second.put('b', np.zeros(1000, dtype = np.uint8))
+    # The files of both stores count against the budget
+    assert not first.put('c', np.zeros(1000, dtype = np.uint8))
+    assert second.get('a').shape == (1000,)
+
+    first.cleanup()
+    assert second.get('a') is None
+    assert second.put('c', np.zeros(1000, dtype = np.uint8))
+
+
+def test_shared_array_store_keeps_size_incrementally(tmp_path, monkeypatch):
+    store = util.SharedArrayStore('store', max_bytes = 2500, root = str(tmp_path))
+    assert store.put('a', np.zeros(1000, dtype = np.uint8))
+    assert store.put('b', np.zeros(1000, dtype = np.uint8))
+    files = [x for x in os.scandir(store.path) if x.name.endswith('.npy')]
+    assert store._read_size() == sum(x.stat().st_size for x in files) == store.nbytes
+
+    # The directory is not scanned again while the size file exists
+    monkeypatch.setattr(util.os, 'scandir', None)
+    assert not store.put('c', np.zeros(1000, dtype = np.uint8))
+    # A full store is not checked again until the recheck period passes
+    monkeypatch.setattr(store, '_read_size', None)
+    assert not store.put('d', np.zeros(1, dtype = np.uint8))
+
+
+def test_depth_to_uint8_truncates_and_saturates():
+    depth = np.array([0.0, 19.0, 20.0, 39.0, 4999.0, 5000.0, 9000.0], dtype = np.float32)
+    assert util.depth_to_uint8(depth).tolist() == [0, 0, 1, 1, 254, 255, 255]
@@ -0,0 +1,44 @@
+import os
+import pytest
+
+scene_images = pytest.importorskip('environments.gym_ai2thor.scene_images')
+
+
+def test_every_output_has_its_own_progress(tmp_path):
+    outputs = scene_images._scene_outputs({ (84, 84): 'a', (172, 172): 'b' })
+    assert [name for name, _ in outputs] == ['shards-84x84', 'shards-172x172']
+    assert scene_images._scene_outputs(None) == [('png', None)]
+
+    open(scene_images._complete_path(str(tmp_path), 'shards-84x84'), 'a').close()
+    assert scene_images._is_complete(str(tmp_path), { (84, 84): 'a' })
+    assert not scene_images._is_complete(str(tmp_path), { (84, 84): 'a', (172, 172): 'b' })
+    assert not scene_images._is_complete(str(tmp_path))
+
+
+def test_shard_writer_refuses_short_files(tmp_path):
+    path = str(tmp_path / 'shard')
+    os.makedirs(path)
+    for mode in scene_images.MODES:
+        with open(os.path.join(path, '%s.u8' % mode), 'wb') as f:
+            f.write(bytes(2 * 4 * 4 * 3 + 5))
+
+    # Rows of an interrupted location are dropped
+    writer = scene_images.ShardSceneWriter({ (4, 4): path }, [('mug', 'a'), ('mug', 'b')])
+    writer.close([('mug', 'a'), ('mug', 'b')])
+    assert os.path.getsize(os.path.join(path, '%s.u8' % scene_images.MODES[0])) == 2 * 4 * 4 * 3
+
+    with pytest.raises(Exception):
+        scene_images.ShardSceneWriter({ (4, 4): path }, [('mug', 'a'), ('mug', 'b'), ('mug', 'c')])
+
+
+def test_legacy_complete_marker_is_not_rendered_again(tmp_path, monkeypatch):
+    open(str(tmp_path / '.complete'), 'a').close()
+    def find_object_locations(scene_name):
+        raise AssertionError('A completed scene must not be rendered again')
+
+    monkeypatch.setattr(scene_images, 'find_object_locations', find_object_locations)
+    monkeypatch.setattr(scene_images, '_start_controller', find_object_locations)
+    assert scene_images._is_complete(str(tmp_path))
+    assert scene_images.render_scene_images(str(tmp_path), 'FloorPlan311') == 'FloorPlan311'
+    assert os.path.isfile(str(tmp_path / '.complete-png'))
+    assert not os.path.exists(str(tmp_path / '.complete'))
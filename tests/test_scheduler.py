@@ -0,0 +1,75 @@
+import pytest
+
+scheduler = pytest.importorskip('environments.gym_house.scheduler')
+partition_scenes, SceneBalancer = scheduler.partition_scenes, scheduler.SceneBalancer
+
+
+def _stats(step_times):
+    return { scene: dict(steps = 100, step_time = step_time, nbytes = 0) for scene, step_time in step_times.items() }
+
+
+def test_partition_scenes():
+    assert partition_scenes(list('abcde'), 2) == [['a', 'b', 'c'], ['d', 'e']]
+    assert partition_scenes(list('ab'), 3) == [['a'], ['b'], ['a']]
+
+
+def test_lpt_assignment_balances_costs():
+    balancer = SceneBalancer(list('abcdef'), 2, stickiness = 0.0)
+    balancer.update([_stats(dict(a = 4.0, b = 3.0, c = 2.0)), _stats(dict(d = 1.0, e = 1.0, f = 1.0))])
+    assignment = balancer.rebalance(force = True)
+    assert assignment is not None
+    assert sorted(len(x) for x in assignment) == [3, 3]
+
+    costs = balancer.scene_costs()
+    loads = balancer._loads(assignment, costs)
+    # The two most expensive scenes end up in different workers
+    assert [i for i, x in enumerate(assignment) if 'a' in x] != [i for i, x in enumerate(assignment) if 'b' in x]
+    assert loads[0] == pytest.approx(loads[1])
+    assert balancer.assignment == assignment
+
+
+def test_stickiness_keeps_scenes_with_similar_cost():
+    balancer = SceneBalancer(list('abcdef'), 2, stickiness = 0.1, min_improvement = 0.0)
+    initial = [set(x) for x in balancer.assignment]
+    balancer.update([_stats(dict(a = 1.0, b = 1.05, c = 0.95)), _stats(dict(d = 1.0, e = 1.0, f = 1.02))])
+    assert [set(x) for x in balancer.compute_assignment()] == initial
+
+    # Without stickiness the scenes are spread by cost only
+    balancer.stickiness = 0.0
+    assert [set(x) for x in balancer.compute_assignment()] != initial
+
+
+def test_min_improvement_keeps_current_assignment():
+    scenes = list('abcd')
+    step_times = dict(a = 1.2, b = 1.0, c = 1.0, d = 1.0)
+
+    balancer = SceneBalancer(scenes, 2, stickiness = 0.0, min_improvement = 0.5)
+    balancer.update([_stats(step_times)])
+    initial = balancer.assignment
+    assert balancer.rebalance(force = True) is None
+    assert balancer.assignment == initial
+
+    balancer = SceneBalancer(scenes, 2, stickiness = 0.0, min_improvement = 0.0)
+    balancer.update([_stats(dict(a = 2.0, b = 2.0, c = 1.0, d = 1.0))])
+    assert balancer.rebalance(force = True) is not None
+
+
+def test_rebalance_respects_period():
+    balancer = SceneBalancer(list('abcd'), 2, period = 3600, min_improvement = 0.0)
+    balancer.update([_stats(dict(a = 2.0, b = 2.0, c = 1.0, d = 1.0))])
+    assert balancer.rebalance() is None
+    assert balancer.rebalance(force = True) is not None
+
+
+def test_no_rebalance_with_shared_scenes():
+    balancer = SceneBalancer(list('ab'), 2)
+    assert not balancer.can_rebalance
+    assert balancer.rebalance(force = True) is None
+
+
+def test_is_due_follows_period():
+    balancer = SceneBalancer(list('abcd'), 2, period = 3600)
+    assert not balancer.is_due()
+    assert balancer.is_due(force = True)
+    balancer.period = 0
+    assert balancer.is_due()